@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Benchmark do generate_catalog.py e do rename_files.py em catálogos sintéticos.
+
+Gera uma árvore de teste (categorias/subcategorias/imagens, com parte dos
+nomes acentuados e parte das imagens com thumbnail em .thumbnails), mede o
+tempo de cada fase e grava o resultado em JSON, para comparar entre commits:
+
+    python3 benchmark_catalog.py --sizes 1000,10000,100000
+    python3 benchmark_catalog.py --compare benchmarks/<commit-antigo>.json
+
+Fases medidas:
+    scan            gc.scan com manifesto vazio (build do zero)
+    thumbnails      busca dos thumbnails existentes (list_thumbnails por pasta)
+    render          gc.render consumido inteiro em memória
+    write           gc.write (index.html, busca, comprimidos, manifesto)
+    scan_warm       gc.scan de novo, reaproveitando o manifesto
+    render_warm     gc.render reaproveitando as seções do manifesto
+    rename_plan     plan_renames (percorre a árvore e monta o plano)
+    rename_apply    apply_plan (executa o plano)
+
+As árvores são criadas numa pasta temporária (fora do repositório) e
+apagadas no final, a não ser com --keep.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import shutil
+import platform
+import contextlib
+
+import generate_catalog as gc
+
+# JPEG 8x8 válido (o scan lê as dimensões do cabeçalho)
+SAMPLE_JPEG = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxOQERXRTc4UG1R'
+    'V19iZ2hnPk1xeXBkeFxlZ2P/2wBDARESEhgVGC8aGi9jQjhCY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2Nj'
+    'Y2NjY2NjY2NjY2NjY2P/wAARCAAIAAgDASIAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAA'
+    'AgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6'
+    'Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXG'
+    'x8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREA'
+    'AgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5'
+    'OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPE'
+    'xcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwDcooorE2P/2Q=='
+)
+
+# Nomes no estilo do catálogo real; a segunda forma é a acentuada
+CATEGORY_WORDS = [
+    ('Calca', 'Calça'), ('Lencol', 'Lençol'), ('Macacao', 'Macacão'), ('Body', 'Body'),
+    ('Pijama', 'Pijama'), ('Touca', 'Touca'), ('Cobertor', 'Cobertor'), ('Saida', 'Saída'),
+    ('Babador', 'Babador'), ('Acessorio', 'Acessório'), ('Cancao', 'Canção'), ('Agasalho', 'Agasalho'),
+]
+SUBCATEGORY_WORDS = [
+    ('0-3 Meses', '0-3 Meses'), ('3-6 Meses', '3-6 Meses'), ('Menino', 'Menino'), ('Menina', 'Menina'),
+    ('Algodao', 'Algodão'), ('Inverno', 'Inverno'), ('Verao', 'Verão'), ('Basico', 'Básico'),
+]
+IMAGE_WORDS = [
+    ('azul', 'azul'), ('rosa', 'rosa'), ('listrado', 'listrado'), ('coracao', 'coração'),
+    ('estampa', 'estampa'), ('urso', 'urso'), ('pescoco', 'pescoço'), ('balao', 'balão'),
+]
+
+PHASES = ('scan', 'thumbnails', 'render', 'write', 'scan_warm', 'render_warm',
+          'rename_plan', 'rename_apply')
+
+
+def pick(words, rng, accent_ratio):
+    """Escolhe uma palavra, acentuada com probabilidade accent_ratio"""
+    plain, accented = rng.choice(words)
+    return accented if rng.random() < accent_ratio else plain
+
+def generate_tree(root, images, categories=12, subcategories=4, accent_ratio=0.3,
+                  thumbnail_ratio=0.8, seed=0):
+    """
+    Cria em root um catálogo sintético com `images` imagens distribuídas por
+    igual entre categories × subcategories pastas, mais o template da página.
+    Uma fração thumbnail_ratio das imagens ganha uma cópia em .thumbnails.
+    Retorna a lista dos caminhos relativos das imagens.
+    """
+    rng = random.Random(seed)
+    folders = []
+    for c in range(categories):
+        category = f"{pick(CATEGORY_WORDS, rng, accent_ratio)} {c + 1}"
+        for s in range(subcategories):
+            folders.append(os.path.join(category, f"{pick(SUBCATEGORY_WORDS, rng, accent_ratio)} {s + 1}"))
+
+    paths = []
+    for n in range(images):
+        folder = folders[n % len(folders)]
+        paths.append(os.path.join(folder, f"{pick(IMAGE_WORDS, rng, accent_ratio)} {n + 1}.jpg"))
+
+    for folder in folders:
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+        os.makedirs(os.path.join(root, '.thumbnails', folder), exist_ok=True)
+    for rel in paths:
+        with open(os.path.join(root, rel), 'wb') as f:
+            f.write(SAMPLE_JPEG)
+        if rng.random() < thumbnail_ratio:
+            with open(os.path.join(root, '.thumbnails', rel), 'wb') as f:
+                f.write(SAMPLE_JPEG)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    shutil.copy(os.path.join(here, gc.TEMPLATE_NAME), os.path.join(root, gc.TEMPLATE_NAME))
+    return paths
+
+
+@contextlib.contextmanager
+def timed(results, phase):
+    """Soma em results[phase] o tempo (em segundos) do bloco"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        results[phase] = results.get(phase, 0.0) + time.perf_counter() - start
+
+def bench_tree(root, options=None):
+    """
+    Mede as fases do generate_catalog e do rename_files numa árvore já
+    gerada. A renomeação vem por último, porque altera a árvore.
+    """
+    from rename_files import apply_plan, plan_renames
+
+    phases = {}
+    template = gc.load_template(root)
+
+    with timed(phases, 'scan'):
+        catalog = gc.scan(root, gc.empty_manifest(), options=options)
+    with timed(phases, 'thumbnails'):
+        for subcats in catalog.categories.values():
+            for items in subcats.values():
+                if items:
+                    gc.list_thumbnails(root, os.path.dirname(items[0].path))
+    with timed(phases, 'render'):
+        chunks = list(gc.render(catalog, template))
+    with timed(phases, 'write'):
+        gc.write(catalog, chunks)
+
+    old_manifest = gc.load_manifest(root)
+    with timed(phases, 'scan_warm'):
+        catalog = gc.scan(root, old_manifest, options=options)
+    with timed(phases, 'render_warm'):
+        chunks = list(gc.render(catalog, template, old_manifest['sections']))
+
+    with timed(phases, 'rename_plan'):
+        plan = plan_renames(root)
+    # apply_plan imprime uma linha por mudança
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with timed(phases, 'rename_apply'):
+            apply_plan(root, plan)
+
+    counts = {'items': len(catalog), 'categories': len(catalog.categories),
+              'renames': len(plan['renames']), 'rename_conflicts': len(plan['conflicts'])}
+    return phases, counts
+
+
+def current_commit():
+    """Hash curto do commit atual (None fora de um repositório git)"""
+    import subprocess
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline):
+    """Mostra, por tamanho e fase, a razão entre o tempo atual e o do baseline"""
+    previous = {run['images']: run['phases'] for run in baseline['runs']}
+    print(f"\n📊 Comparação com {baseline.get('commit') or 'baseline'} (atual / anterior):")
+    for run in results['runs']:
+        old = previous.get(run['images'])
+        if not old:
+            print(f"   {run['images']} imagens: sem medida anterior")
+            continue
+        ratios = []
+        for phase in PHASES:
+            if old.get(phase) and phase in run['phases']:
+                ratio = run['phases'][phase] / old[phase]
+                mark = ' ⚠️' if ratio > 1.2 else ''
+                ratios.append(f"{phase} {ratio:.2f}x{mark}")
+        print(f"   {run['images']} imagens: " + ', '.join(ratios))
+
+
+def main():
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='Benchmark do gerador do catálogo em árvores sintéticas')
+    parser.add_argument('--sizes', default='1000,10000', metavar='N,N,...',
+                        help='quantidades de imagens (uma árvore por tamanho; ex.: 1000,10000,100000)')
+    parser.add_argument('--categories', type=int, default=12, metavar='N')
+    parser.add_argument('--subcategories', type=int, default=4, metavar='N',
+                        help='subcategorias por categoria')
+    parser.add_argument('--accent-ratio', type=float, default=0.3, metavar='R',
+                        help='fração dos nomes com acento (0 a 1)')
+    parser.add_argument('--thumbnail-ratio', type=float, default=0.8, metavar='R',
+                        help='fração das imagens com thumbnail em .thumbnails (0 a 1)')
+    parser.add_argument('--sharded', action='store_true', help='mede o modo sharded')
+    parser.add_argument('--compact', action='store_true', help='mede o modo compact')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', metavar='ARQUIVO',
+                        help='onde gravar o JSON (padrão: benchmarks/<commit>.json)')
+    parser.add_argument('--compare', metavar='ARQUIVO', help='JSON de uma execução anterior')
+    parser.add_argument('--keep', action='store_true', help='não apaga as árvores geradas')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    options = {'compact': args.compact, 'sharded': args.sharded}
+    commit = current_commit()
+    results = {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': options,
+        'runs': [],
+    }
+
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix=f'catalog-bench-{size}-')
+        try:
+            print(f"⏳ Gerando árvore com {size} imagens em {root}...")
+            start = time.perf_counter()
+            generate_tree(root, size, args.categories, args.subcategories,
+                          args.accent_ratio, args.thumbnail_ratio, args.seed)
+            generate_time = time.perf_counter() - start
+
+            phases, counts = bench_tree(root, options)
+            results['runs'].append({
+                'images': size,
+                'categories': args.categories,
+                'subcategories': args.subcategories,
+                'accent_ratio': args.accent_ratio,
+                'thumbnail_ratio': args.thumbnail_ratio,
+                'generate': round(generate_time, 4),
+                'counts': counts,
+                'phases': {phase: round(seconds, 4) for phase, seconds in phases.items()},
+            })
+            print(f"✅ {size} imagens: " + ', '.join(f"{phase} {phases[phase]:.3f}s" for phase in PHASES))
+        finally:
+            if args.keep:
+                print(f"   Árvore mantida em {root}")
+            else:
+                shutil.rmtree(root, ignore_errors=True)
+
+    output = args.output or os.path.join('benchmarks', f"{commit or 'resultado'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    print(f"✅ Resultados gravados em {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Processamento das imagens do catálogo (usado pelo generate_catalog.py)
+
+- Gera os thumbnails que faltam em .thumbnails (imagens copiadas direto para
+  as pastas não passam pelo sharp do server.js)
+- Gera variantes WebP em várias larguras para o srcset dos cards
+- Lê largura/altura das imagens só pelo cabeçalho (sem decodificar)
+- Gera placeholders minúsculos (LQIP) embutidos nos cards enquanto a imagem carrega
+
+A geração depende do Pillow (pip install Pillow), importado só quando
+necessário; a leitura das dimensões usa apenas a biblioteca padrão.
+"""
+import io
+import os
+import json
+import base64
+import time
+import struct
+import hashlib
+import contextlib
+
+THUMBNAILS_DIR = '.thumbnails'
+
+# Mesmos parâmetros do generateThumbnail do server.js (sharp: 400x400, cover, JPEG 85)
+THUMBNAIL_SIZE = 400
+THUMBNAIL_QUALITY = 85
+
+# Variantes WebP quadradas: <thumbnail>.<largura>w.webp, ao lado do thumbnail
+VARIANT_WIDTHS = (160, 320, 640)
+VARIANT_QUALITY = 80
+
+# Índice com o hash do conteúdo de cada imagem já processada
+THUMBNAIL_INDEX = os.path.join(THUMBNAILS_DIR, '.index.json')
+
+# Placeholders: WebP quadrado de 16 px em base64, indexado pelo SHA-1 da imagem
+PLACEHOLDER_INDEX = os.path.join(THUMBNAILS_DIR, '.placeholders.json')
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+# Até quantas imagens o map_images processa no próprio processo, sem pool
+INLINE_LIMIT = 8
+
+
+def variant_name(filename, width):
+    return f"{filename}.{width}w.webp"
+
+def file_digest(path):
+    """
+    SHA-1 do conteúdo de um arquivo, lido em blocos
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def pillow_available():
+    import importlib.util
+
+    return importlib.util.find_spec('PIL') is not None
+
+
+# ---------------------------------------------------------------------------
+# Dimensões pelo cabeçalho
+# ---------------------------------------------------------------------------
+
+# Marcadores SOF do JPEG (C4, C8 e CC não são SOF)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def exif_orientation(segment):
+    """
+    Orientação EXIF (tag 0x0112) de um segmento APP1, ou 1 se não houver
+    """
+    if not segment.startswith(b'Exif\x00\x00') or len(segment) < 14:
+        return 1
+    tiff = segment[6:]
+    endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if endian is None:
+        return 1
+    try:
+        (ifd_offset,) = struct.unpack_from(endian + 'I', tiff, 4)
+        (count,) = struct.unpack_from(endian + 'H', tiff, ifd_offset)
+        for i in range(count):
+            tag, _, _, value = struct.unpack_from(endian + 'HHIH', tiff, ifd_offset + 2 + i * 12)
+            if tag == 0x0112:
+                return value
+    except struct.error:
+        pass
+    return 1
+
+def jpeg_dimensions(f):
+    orientation = 1
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        # Pular bytes de preenchimento até o próximo marcador
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+
+        # Marcadores sem segmento
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker == 0xD9:
+            return None
+
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        (length,) = struct.unpack('>H', header)
+
+        if marker in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>xHH', data)
+            # Orientações 5 a 8 giram a imagem em 90°: o navegador exibe invertido
+            if orientation >= 5:
+                width, height = height, width
+            return width, height
+        if marker == 0xE1 and orientation == 1:
+            orientation = exif_orientation(f.read(length - 2))
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+def image_dimensions(path):
+    """
+    (largura, altura) de uma imagem JPEG, PNG, GIF ou WebP lendo apenas o
+    cabeçalho. Retorna None se o formato não for reconhecido.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(32)
+
+            if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+                return struct.unpack('>II', head[16:24])
+
+            if head[:6] in (b'GIF87a', b'GIF89a'):
+                return struct.unpack('<HH', head[6:10])
+
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                chunk = head[12:16]
+                if chunk == b'VP8 ':
+                    width, height = struct.unpack('<HH', head[26:30])
+                    return width & 0x3FFF, height & 0x3FFF
+                if chunk == b'VP8L':
+                    b0, b1, b2, b3 = head[21:25]
+                    return ((b0 | (b1 & 0x3F) << 8) + 1,
+                            ((b1 >> 6) | (b2 << 2) | (b3 & 0x0F) << 10) + 1)
+                if chunk == b'VP8X':
+                    return (int.from_bytes(head[24:27], 'little') + 1,
+                            int.from_bytes(head[27:30], 'little') + 1)
+                return None
+
+            if head[:2] == b'\xff\xd8':
+                return jpeg_dimensions(f)
+    except (OSError, struct.error, ValueError):
+        return None
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Índice de thumbnails
+# ---------------------------------------------------------------------------
+
+def atomic_write(path, chunks, binary=False):
+    """
+    Grava os pedaços de chunks (qualquer iterável, inclusive um gerador; texto,
+    ou bytes com binary=True) num arquivo temporário na mesma pasta e só então
+    troca o arquivo final com os.replace. Quem lê o arquivo (ex.: o express
+    servindo o index.html) vê a versão antiga ou a nova inteira, nunca uma pela metade.
+    Retorna o tamanho gravado.
+    """
+    import tempfile
+
+    directory = os.path.dirname(path) or '.'
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with open(fd, 'wb') if binary else open(fd, 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            size = os.fstat(f.fileno()).st_size
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    return size
+
+def load_index(base_dir, index_path):
+    try:
+        with open(os.path.join(base_dir, index_path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+def save_index(base_dir, index_path, index):
+    os.makedirs(os.path.join(base_dir, THUMBNAILS_DIR), exist_ok=True)
+    atomic_write(os.path.join(base_dir, index_path),
+                 [json.dumps(index, ensure_ascii=False, separators=(',', ':'))])
+
+def load_thumbnail_index(base_dir):
+    return load_index(base_dir, THUMBNAIL_INDEX)
+
+def save_thumbnail_index(base_dir, index):
+    save_index(base_dir, THUMBNAIL_INDEX, index)
+
+def outputs_exist(base_dir, rel_path, widths):
+    thumbnail = os.path.join(base_dir, THUMBNAILS_DIR, rel_path)
+    if not os.path.exists(thumbnail):
+        return False
+    return all(os.path.exists(variant_name(thumbnail, width)) for width in widths)
+
+
+# ---------------------------------------------------------------------------
+# Geração (roda nos processos do pool)
+# ---------------------------------------------------------------------------
+
+def save_replacing(image, path, *args, **kwargs):
+    """
+    Grava a imagem num temporário e renomeia por cima: ninguém lê um arquivo
+    pela metade, e o mtime da pasta muda, o que faz o scan do gerador reler
+    as versões (ETags) dos thumbnails dela
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        image.save(temp_path, *args, **kwargs)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+
+def render_thumbnails(job):
+    """
+    Gera o thumbnail JPEG e as variantes WebP de uma imagem. Com
+    keep_thumbnail, o thumbnail existente (ex.: feito pelo sharp no upload) é
+    mantido e só as variantes que faltam são gravadas.
+    Retorna (caminho relativo, larguras das variantes, segundos, erro ou None).
+    """
+    base_dir, rel_path, keep_thumbnail = job
+    started = time.perf_counter()
+    try:
+        from PIL import Image, ImageOps
+
+        thumbnail = os.path.join(base_dir, THUMBNAILS_DIR, rel_path)
+        os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+
+        with Image.open(os.path.join(base_dir, rel_path)) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+
+            # Mesmo nome do original, conteúdo JPEG (igual ao sharp do server.js)
+            if not keep_thumbnail:
+                save_replacing(ImageOps.fit(image, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS),
+                               thumbnail, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+
+            widths = []
+            for width in VARIANT_WIDTHS:
+                # Não ampliar: larguras maiores que a imagem original são puladas
+                if width > min(image.size):
+                    break
+                widths.append(width)
+                if keep_thumbnail and os.path.exists(variant_name(thumbnail, width)):
+                    continue
+                save_replacing(ImageOps.fit(image, (width, width), Image.LANCZOS),
+                               variant_name(thumbnail, width), 'WEBP', quality=VARIANT_QUALITY)
+
+            # Variantes que sobraram de uma versão maior da imagem
+            for width in VARIANT_WIDTHS[len(widths):]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(variant_name(thumbnail, width))
+    except Exception as e:
+        return rel_path, [], time.perf_counter() - started, f"{type(e).__name__}: {e}"
+
+    return rel_path, widths, time.perf_counter() - started, None
+
+def open_reduced(source, mode, size):
+    """
+    Abre a imagem (caminho ou arquivo) já na orientação certa e convertida para
+    mode, decodificando só o suficiente para reduzi-la a size
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        # JPEG: decodificar já reduzido (draft) em vez da imagem inteira
+        image.draft(mode, size)
+        return ImageOps.exif_transpose(image).convert(mode)
+
+def map_images(function, jobs, max_workers=None):
+    """
+    Lista com function aplicada a cada job, num pool de processos. Com poucos
+    jobs (uploads, patch) roda no próprio processo: subir um pool custaria
+    mais que processar.
+    """
+    if len(jobs) <= INLINE_LIMIT:
+        return [function(job) for job in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(function, jobs, chunksize=16))
+
+def render_placeholder(job):
+    """
+    Gera o placeholder (data URI de um WebP de 16 px) de uma imagem.
+    Retorna (hash, data URI ou None).
+    """
+    path, digest = job
+    try:
+        from PIL import Image, ImageOps
+
+        image = open_reduced(path, 'RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+        buffer = io.BytesIO()
+        ImageOps.fit(image, (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR).save(
+            buffer, 'WEBP', quality=PLACEHOLDER_QUALITY)
+    except Exception:
+        return digest, None
+
+    return digest, 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+# ---------------------------------------------------------------------------
+# Placeholders (chamado pelo build)
+# ---------------------------------------------------------------------------
+
+def ensure_placeholders(base_dir, digests, prune=False):
+    """
+    Garante um placeholder para cada hash em digests ({sha1: caminho relativo}).
+    Só as imagens com hash novo são decodificadas, em lote num pool de processos;
+    sem Pillow, ficam sem placeholder. Com prune=True, hashes que não estão em
+    digests são esquecidos.
+
+    Retorna o dict {sha1: data URI}.
+    """
+    index = load_index(base_dir, PLACEHOLDER_INDEX)
+    missing = [(os.path.join(base_dir, rel_path), digest)
+               for digest, rel_path in digests.items() if digest not in index]
+    changed = False
+
+    if missing and pillow_available():
+        for digest, placeholder in map_images(render_placeholder, missing):
+            if placeholder:
+                index[digest] = placeholder
+                changed = True
+
+    if prune:
+        for digest in [digest for digest in index if digest not in digests]:
+            del index[digest]
+            changed = True
+
+    if changed:
+        save_index(base_dir, PLACEHOLDER_INDEX, index)
+    return index
+
+
+# ---------------------------------------------------------------------------
+# Etapa --thumbnails
+# ---------------------------------------------------------------------------
+
+def backfill_thumbnails(base_dir, rel_paths, jobs=None, force=False):
+    """
+    Gera thumbnail e variantes para as imagens que ainda não têm, ou cujo
+    conteúdo mudou desde a última geração. Imagens com tamanho e mtime iguais
+    aos do índice nem são lidas; se só o mtime mudou, o hash do conteúdo decide.
+    Um thumbnail que já existe sem entrada no índice (gerado pelo sharp do
+    server.js no upload) é mantido: só as variantes que faltam são geradas.
+
+    Retorna um dict com as estatísticas, ou None se o Pillow não estiver instalado.
+    """
+    if not pillow_available():
+        print("⚠️  Pillow não instalado (pip install Pillow): thumbnails não foram gerados")
+        return None
+
+    started = time.perf_counter()
+    index = load_thumbnail_index(base_dir)
+    pending = []
+    skipped = 0
+
+    for rel_path in rel_paths:
+        st = os.stat(os.path.join(base_dir, rel_path))
+        cached = index.get(rel_path)
+        thumbnail = os.path.join(base_dir, THUMBNAILS_DIR, rel_path)
+
+        if force:
+            pending.append((rel_path, file_digest(os.path.join(base_dir, rel_path)), st, False))
+            continue
+
+        if cached is not None and cached['size'] == st.st_size and cached['mtime'] == st.st_mtime_ns:
+            digest = cached['sha1']
+        else:
+            digest = file_digest(os.path.join(base_dir, rel_path))
+
+        if cached is None:
+            # Thumbnail sem entrada no índice: feito a partir do conteúdo atual
+            keep_thumbnail = os.path.exists(thumbnail)
+            widths = VARIANT_WIDTHS
+        else:
+            keep_thumbnail = digest == cached['sha1'] and os.path.exists(thumbnail)
+            widths = cached['widths']
+
+        if keep_thumbnail and outputs_exist(base_dir, rel_path, widths):
+            index[rel_path] = {
+                'size': st.st_size,
+                'mtime': st.st_mtime_ns,
+                'sha1': digest,
+                'widths': list(widths),
+            }
+            skipped += 1
+            continue
+
+        pending.append((rel_path, digest, st, keep_thumbnail))
+
+    generated = 0
+    completed = 0
+    errors = []
+    image_seconds = 0.0
+    if pending:
+        from concurrent.futures import ProcessPoolExecutor
+
+        meta = {rel_path: (digest, st, keep_thumbnail) for rel_path, digest, st, keep_thumbnail in pending}
+        jobs_list = [(base_dir, rel_path, keep_thumbnail) for rel_path, _, _, keep_thumbnail in pending]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for rel_path, widths, seconds, error in pool.map(render_thumbnails, jobs_list, chunksize=4):
+                image_seconds += seconds
+                if error:
+                    errors.append((rel_path, error))
+                    continue
+                digest, st, keep_thumbnail = meta[rel_path]
+                index[rel_path] = {
+                    'size': st.st_size,
+                    'mtime': st.st_mtime_ns,
+                    'sha1': digest,
+                    'widths': widths,
+                }
+                if keep_thumbnail:
+                    completed += 1
+                else:
+                    generated += 1
+
+    # Esquecer imagens que não existem mais
+    current = set(rel_paths)
+    for rel_path in [rel_path for rel_path in index if rel_path not in current]:
+        del index[rel_path]
+    save_thumbnail_index(base_dir, index)
+
+    stats = {
+        'generated': generated,
+        'completed': completed,
+        'skipped': skipped,
+        'errors': len(errors),
+        'seconds': time.perf_counter() - started,
+        'ms_per_image': (image_seconds / len(pending) * 1000) if pending else 0.0,
+    }
+
+    for rel_path, error in errors:
+        print(f"❌ {rel_path}: {error}")
+    print(f"🖼️  Thumbnails gerados: {generated} | só variantes: {completed} | "
+          f"pulados (sem mudança): {skipped} | erros: {len(errors)}")
+    if pending:
+        print(f"🖼️  Tempo por imagem: {stats['ms_per_image']:.1f} ms (total {stats['seconds']:.2f} s)")
+    return stats
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Observação das pastas do catálogo (usado pelo generate_catalog.py --watch)
+
+- No Linux usa o inotify do kernel (via ctypes, sem dependências): o
+  processo fica bloqueado no select até algo mudar, sem gastar CPU
+- Nos outros sistemas, ou se o inotify não estiver disponível (limite de
+  watches, sistemas de arquivos de rede), compara periodicamente só o mtime
+  das pastas e lista apenas as que mudaram
+- Agrupa rajadas de mudanças (cópia de várias imagens, git pull) num lote só
+
+As mudanças são entregues como caminhos relativos com '/'. O caminho vazio
+(RESCAN) indica que eventos se perderam e tudo deve ser conferido.
+"""
+import os
+import sys
+import abc
+import time
+import errno
+import struct
+import select
+
+# Espera sem novos eventos antes de entregar o lote, e espera máxima de um lote
+DEBOUNCE_SECONDS = 1.0
+MAX_DELAY_SECONDS = 10.0
+
+# Intervalo entre as verificações do modo polling
+POLL_INTERVAL = 2.0
+
+# Por quanto tempo as mudanças feitas pelo próprio processo são descartadas:
+# dois intervalos de polling e mais um segundo (ver ignore_window)
+IGNORE_SECONDS = 2 * POLL_INTERVAL + 1
+
+RESCAN = ''
+
+# Constantes de <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def join(rel_dir, name):
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+def is_under(rel_path, rel_dir):
+    return rel_path == rel_dir or rel_path.startswith(rel_dir + '/')
+
+
+class Watcher(abc.ABC):
+    """
+    Base dos dois modos. include(caminho, é_pasta) decide quais pastas são
+    observadas e quais mudanças são entregues.
+    """
+
+    # Padrão do ignore()
+    ignore_seconds = IGNORE_SECONDS
+
+    def __init__(self, base_dir, include):
+        self.base_dir = base_dir
+        self.include = include
+        self.ignored = {}
+
+    def ignore(self, rel_paths, seconds=None):
+        """
+        Descarta a próxima mudança em cada um desses caminhos, se chegar nos
+        próximos segundos (ex.: renomeações feitas pelo próprio processo)
+        """
+        deadline = time.monotonic() + (self.ignore_seconds if seconds is None else seconds)
+        for rel_path in rel_paths:
+            self.ignored[rel_path] = deadline
+
+    def filter(self, changed):
+        now = time.monotonic()
+        self.ignored = {rel_path: deadline for rel_path, deadline in self.ignored.items() if deadline > now}
+        expected = {rel_path for rel_path in changed if rel_path in self.ignored}
+        for rel_path in expected:
+            del self.ignored[rel_path]
+        return changed - expected
+
+    def subdirs(self, rel_dir):
+        """Subpastas observáveis de rel_dir (um scandir)"""
+        try:
+            with os.scandir(os.path.join(self.base_dir, rel_dir)) as entries:
+                return [entry.name for entry in entries
+                        if entry.is_dir(follow_symlinks=False) and self.include(join(rel_dir, entry.name), True)]
+        except OSError:
+            return []
+
+    @abc.abstractmethod
+    def wait(self, timeout=None):
+        """
+        Espera até timeout segundos (None: sem limite) e retorna o conjunto
+        dos caminhos alterados (vazio se nada mudou no período)
+        """
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(Watcher):
+    """
+    Um watch do inotify por pasta. Pastas criadas ou trazidas para dentro do
+    catálogo ganham watches na hora; as removidas ou levadas para fora perdem.
+    Levanta OSError se o inotify não estiver disponível.
+    """
+
+    def __init__(self, base_dir, include):
+        super().__init__(base_dir, include)
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError('inotify indisponível')
+        self.ctypes = ctypes
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        self.paths = {}
+        try:
+            self.add_tree(RESCAN)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, rel_dir):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(os.path.join(self.base_dir, rel_dir)), WATCH_MASK)
+        if wd < 0:
+            error = self.ctypes.get_errno()
+            # A pasta pode ter sumido entre o scandir e o add_watch
+            if error == errno.ENOENT:
+                return
+            # ENOSPC: limite fs.inotify.max_user_watches
+            raise OSError(error, f"inotify_add_watch: {os.strerror(error)}")
+        self.paths[wd] = rel_dir
+        for name in self.subdirs(rel_dir):
+            self.add_tree(join(rel_dir, name))
+
+    def remove_tree(self, rel_dir):
+        for wd, path in list(self.paths.items()):
+            if is_under(path, rel_dir):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.paths[wd]
+
+    def read_events(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    changed.add(RESCAN)
+                    continue
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                rel_dir = self.paths.get(wd)
+                if rel_dir is None or not name:
+                    continue
+
+                rel_path = join(rel_dir, name)
+                is_dir = bool(mask & IN_ISDIR)
+                if not self.include(rel_path, is_dir):
+                    continue
+                if is_dir and mask & (IN_MOVED_FROM | IN_DELETE):
+                    self.remove_tree(rel_path)
+                elif is_dir and mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(rel_path)
+                # Arquivos criados só contam ao terminar a escrita (IN_CLOSE_WRITE)
+                if is_dir or not mask & IN_CREATE:
+                    changed.add(rel_path)
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return set()
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return set()
+            # Eventos que não interessam (ex.: arquivo ainda sendo copiado) não encerram a espera
+            changed = self.filter(self.read_events())
+            if changed:
+                return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher(Watcher):
+    """
+    Guarda o mtime e a listagem de cada pasta. A cada intervalo faz um stat
+    por pasta; só as pastas cujo mtime mudou são listadas de novo, e a
+    diferença entre as listagens dá os caminhos alterados.
+    """
+
+    def __init__(self, base_dir, include, interval=POLL_INTERVAL):
+        super().__init__(base_dir, include)
+        self.interval = interval
+        self.ignore_seconds = ignore_window(interval)
+        self.dirs = {}
+        self.add_tree(RESCAN)
+
+    def listing(self, rel_dir):
+        """(mtime, {nome: é_pasta}) de uma pasta, ou None se ela não existe mais"""
+        path = os.path.join(self.base_dir, rel_dir)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                return mtime, {entry.name: entry.is_dir(follow_symlinks=False) for entry in entries}
+        except OSError:
+            return None
+
+    def add_tree(self, rel_dir):
+        state = self.listing(rel_dir)
+        if state is None:
+            return
+        self.dirs[rel_dir] = state
+        for name, is_dir in state[1].items():
+            if is_dir and self.include(join(rel_dir, name), True):
+                self.add_tree(join(rel_dir, name))
+
+    def remove_tree(self, rel_dir):
+        for path in [path for path in self.dirs if is_under(path, rel_dir)]:
+            del self.dirs[path]
+
+    def check(self):
+        changed = set()
+        for rel_dir in list(self.dirs):
+            if rel_dir not in self.dirs:
+                continue
+            mtime, names = self.dirs[rel_dir]
+            try:
+                if os.stat(os.path.join(self.base_dir, rel_dir)).st_mtime_ns == mtime:
+                    continue
+            except OSError:
+                # A pasta sumiu: a listagem da pasta de cima registra a mudança
+                self.remove_tree(rel_dir)
+                continue
+
+            state = self.listing(rel_dir)
+            if state is None:
+                self.remove_tree(rel_dir)
+                continue
+            self.dirs[rel_dir] = state
+            current = state[1]
+            for name in names.keys() - current.keys():
+                rel_path = join(rel_dir, name)
+                if names[name]:
+                    self.remove_tree(rel_path)
+                if self.include(rel_path, names[name]):
+                    changed.add(rel_path)
+            for name in current.keys() - names.keys():
+                rel_path = join(rel_dir, name)
+                if self.include(rel_path, current[name]):
+                    if current[name]:
+                        self.add_tree(rel_path)
+                    changed.add(rel_path)
+        return changed
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self.filter(self.check())
+            if changed:
+                return changed
+            remaining = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if remaining <= 0:
+                return set()
+            time.sleep(remaining)
+
+
+def ignore_window(interval):
+    """
+    Segundos para descartar as mudanças do próprio processo no polling: a
+    mudança só aparece num check, até um intervalo depois, e o lote dela
+    ainda espera o debounce
+    """
+    return 2 * interval + 1
+
+def open_watcher(base_dir, include, poll_interval=None):
+    """
+    Watcher com inotify quando disponível; senão (ou com poll_interval) por polling
+    """
+    if poll_interval is None and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(base_dir, include)
+        except OSError as e:
+            print(f"⚠️  inotify indisponível ({e}), usando polling")
+    return PollingWatcher(base_dir, include, poll_interval or POLL_INTERVAL)
+
+def batches(watcher, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+    """
+    Gerador com os lotes de caminhos alterados: depois da primeira mudança,
+    espera debounce segundos sem novidades (ou no máximo max_delay) antes de
+    entregar o lote
+    """
+    while True:
+        changed = watcher.wait()
+        if not changed:
+            continue
+        started = time.monotonic()
+        while time.monotonic() - started < max_delay:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changed |= more
+        yield changed
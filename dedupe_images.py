@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Encontra imagens duplicadas no catálogo e na pasta thumbmails
+
+- Cópias exatas: mesmo SHA-256 do conteúdo
+- Quase iguais (mesma foto recomprimida, redimensionada ou salva de novo):
+  dHash de 64 bits a poucos bits de distância, buscados numa BK-tree em vez
+  de comparar todos os pares
+- As impressões digitais são calculadas num pool de processos e ficam em
+  .thumbnails/.fingerprints.json; arquivos com tamanho e mtime iguais aos do
+  cache não são lidos de novo
+
+    python3 dedupe_images.py                  # relatório
+    python3 dedupe_images.py --json dup.json  # relatório em JSON
+    python3 dedupe_images.py --link           # troca as cópias exatas por hard links
+
+Só as cópias exatas são trocadas por hard links (o conteúdo é o mesmo byte a
+byte). As quase iguais aparecem no relatório para decidir qual apagar.
+
+O dHash precisa do Pillow (pip install Pillow); sem ele só as cópias exatas
+são encontradas.
+"""
+import io
+import os
+import json
+import time
+import hashlib
+
+from catalog_images import THUMBNAILS_DIR, load_index, map_images, open_reduced, pillow_available, save_index
+from generate_catalog import IMAGE_EXTENSIONS, SHARDS_DIR, natural_sort_key
+
+# Cache das impressões digitais: {caminho relativo: {size, mtime, sha256, dhash}}
+FINGERPRINT_INDEX = os.path.join(THUMBNAILS_DIR, '.fingerprints.json')
+
+# Pasta com imagens antigas/duplicadas (ver IGNORED_FOLDERS do generate_catalog.py):
+# entra na busca, mas numa duplicata a cópia mantida é sempre a do catálogo
+OLD_IMAGES_DIR = 'thumbmails'
+IGNORED_DIRS = {'node_modules', SHARDS_DIR}
+
+# dHash: imagem reduzida para (DHASH_SIZE + 1) x DHASH_SIZE em tons de cinza,
+# um bit por par de pixels vizinhos na horizontal
+DHASH_SIZE = 8
+# Bits diferentes até os quais duas imagens são consideradas quase iguais
+MAX_DISTANCE = 6
+
+
+def list_images(base_dir):
+    """
+    Caminhos relativos de todas as imagens das categorias e da thumbmails,
+    em ordem natural
+    """
+    found = []
+    for root, dirs, files in os.walk(base_dir):
+        rel_dir = os.path.relpath(root, base_dir).replace(os.sep, '/')
+        rel_dir = '' if rel_dir == '.' else rel_dir
+        dirs[:] = [name for name in dirs if not name.startswith('.') and name not in IGNORED_DIRS]
+        # Arquivos soltos na raiz (index.html, scripts...) não são do catálogo
+        if not rel_dir:
+            continue
+        found.extend(f"{rel_dir}/{name}" for name in files
+                     if not name.startswith('.') and os.path.splitext(name.lower())[1] in IMAGE_EXTENSIONS)
+    return sorted(found, key=natural_sort_key)
+
+
+# ---------------------------------------------------------------------------
+# Impressões digitais (rodam nos processos do pool)
+# ---------------------------------------------------------------------------
+
+def dhash(data):
+    """
+    dHash da imagem (inteiro de 64 bits), ou None se não der para decodificar
+    """
+    from PIL import Image
+
+    try:
+        image = open_reduced(io.BytesIO(data), 'L', (DHASH_SIZE * 8, DHASH_SIZE * 8))
+        pixels = image.resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS).tobytes()
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            index = row * (DHASH_SIZE + 1) + col
+            value = (value << 1) | int(pixels[index] > pixels[index + 1])
+    return value
+
+def fingerprint(job):
+    """
+    Lê o arquivo uma vez e calcula SHA-256 e dHash.
+    Retorna (caminho relativo, sha256, dhash em hexadecimal ou None).
+    """
+    path, rel_path, perceptual = job
+    with open(path, 'rb') as f:
+        data = f.read()
+    value = dhash(data) if perceptual else None
+    return rel_path, hashlib.sha256(data).hexdigest(), None if value is None else f"{value:016x}"
+
+def fingerprint_images(base_dir, rel_paths, jobs=None):
+    """
+    {caminho relativo: {size, mtime, sha256, dhash}} das imagens, reaproveitando
+    o cache. Retorna também as estatísticas (lidas, reaproveitadas, segundos).
+    """
+    started = time.perf_counter()
+    perceptual = pillow_available()
+    if not perceptual:
+        print("⚠️  Pillow não instalado (pip install Pillow): só as cópias exatas serão encontradas")
+
+    cache = load_index(base_dir, FINGERPRINT_INDEX)
+    fingerprints = {}
+    pending = []
+    for rel_path in rel_paths:
+        st = os.stat(os.path.join(base_dir, rel_path))
+        cached = cache.get(rel_path)
+        if (cached is not None and
+                cached['size'] == st.st_size and cached['mtime'] == st.st_mtime_ns and
+                (cached['dhash'] is not None or not perceptual)):
+            fingerprints[rel_path] = cached
+            continue
+        fingerprints[rel_path] = {'size': st.st_size, 'mtime': st.st_mtime_ns}
+        pending.append((os.path.join(base_dir, rel_path), rel_path, perceptual))
+
+    for rel_path, sha256, value in map_images(fingerprint, pending, max_workers=jobs):
+        fingerprints[rel_path].update(sha256=sha256, dhash=value)
+
+    # O cache fica só com as imagens que ainda existem
+    if fingerprints != cache:
+        save_index(base_dir, FINGERPRINT_INDEX, fingerprints)
+    stats = {
+        'images': len(rel_paths),
+        'read': len(pending),
+        'reused': len(rel_paths) - len(pending),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    return fingerprints, stats
+
+
+# ---------------------------------------------------------------------------
+# BK-tree
+# ---------------------------------------------------------------------------
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """
+    Árvore BK na distância de Hamming: cada nó guarda os filhos pela
+    distância até ele. Pela desigualdade triangular, a busca por vizinhos a
+    até r bits de h só desce nos filhos com distância entre d - r e d + r
+    (d = distância de h ao nó), o que poda quase toda a árvore para r pequeno.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value):
+        if self.root is None:
+            self.root = (value, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Valores a até radius bits de value"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append(node_value)
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+# ---------------------------------------------------------------------------
+# Grupos de duplicatas
+# ---------------------------------------------------------------------------
+
+def keep_order(rel_path):
+    """
+    Qual cópia de um grupo é mantida: a primeira nesta ordem (as do catálogo
+    antes das da thumbmails, depois o caminho mais curto, que costuma ser o
+    original e não "foto - cópia.jpg", e a ordem natural)
+    """
+    return (rel_path.split('/', 1)[0] == OLD_IMAGES_DIR, len(rel_path), natural_sort_key(rel_path))
+
+def find_duplicates(fingerprints, max_distance=MAX_DISTANCE):
+    """
+    Retorna (exatas, quase_iguais): listas de grupos, cada grupo uma lista de
+    caminhos com a cópia mantida primeiro. Num grupo de quase iguais, cópias
+    exatas entre si aparecem só uma vez (a mantida do grupo exato).
+    """
+    by_sha = {}
+    for rel_path, entry in fingerprints.items():
+        by_sha.setdefault(entry['sha256'], []).append(rel_path)
+    exact = sorted((sorted(paths, key=keep_order) for paths in by_sha.values() if len(paths) > 1),
+                   key=lambda group: keep_order(group[0]))
+
+    # Um representante por conteúdo; imagens diferentes podem ter o mesmo dHash
+    by_dhash = {}
+    for paths in by_sha.values():
+        keeper = min(paths, key=keep_order)
+        value = fingerprints[keeper]['dhash']
+        if value is not None:
+            by_dhash.setdefault(int(value, 16), []).append(keeper)
+
+    tree = BKTree()
+    for value in by_dhash:
+        tree.add(value)
+
+    # Union-find sobre os dHashes: vizinhos de vizinhos ficam no mesmo grupo
+    parent = {value: value for value in by_dhash}
+
+    def find(value):
+        while parent[value] != value:
+            parent[value] = parent[parent[value]]
+            value = parent[value]
+        return value
+
+    for value in by_dhash:
+        for other in tree.search(value, max_distance):
+            parent[find(other)] = find(value)
+
+    groups = {}
+    for value, paths in by_dhash.items():
+        groups.setdefault(find(value), []).extend(paths)
+    near = sorted((sorted(paths, key=keep_order) for paths in groups.values() if len(paths) > 1),
+                  key=lambda group: keep_order(group[0]))
+    return exact, near
+
+
+# ---------------------------------------------------------------------------
+# Hard links
+# ---------------------------------------------------------------------------
+
+def link_duplicates(base_dir, exact, fingerprints):
+    """
+    Troca cada cópia exata por um hard link para a cópia mantida (de forma
+    atômica: link temporário + os.replace). Cópias que já são o mesmo arquivo
+    são puladas. Retorna (arquivos trocados, bytes liberados).
+
+    Uma imagem ligada não pode ser regravada no lugar, senão todas as cópias
+    mudam juntas: o /api/update-image do server.js grava num temporário e
+    renomeia por cima, desfazendo o link.
+    """
+    linked = 0
+    freed = 0
+    for keeper, *copies in exact:
+        keeper_path = os.path.join(base_dir, keeper)
+        keeper_stat = os.stat(keeper_path)
+        for rel_path in copies:
+            path = os.path.join(base_dir, rel_path)
+            st = os.stat(path)
+            if (st.st_dev, st.st_ino) == (keeper_stat.st_dev, keeper_stat.st_ino):
+                continue
+            temp_path = path + '.dedupe-tmp'
+            try:
+                os.link(keeper_path, temp_path)
+                os.replace(temp_path, path)
+            except OSError as e:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                print(f"  ⚠️  {rel_path}: {e}")
+                continue
+            print(f"  🔗 {rel_path} → {keeper}")
+            # Mesmo inode: tamanho e mtime agora são os da cópia mantida
+            fingerprints[rel_path] = dict(fingerprints[keeper])
+            linked += 1
+            freed += st.st_size
+    return linked, freed
+
+
+# ---------------------------------------------------------------------------
+# Relatório
+# ---------------------------------------------------------------------------
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def wasted_bytes(base_dir, exact, fingerprints):
+    """
+    Bytes ocupados pelas cópias exatas que ainda não são hard links da mantida
+    """
+    total = 0
+    for keeper, *copies in exact:
+        st = os.stat(os.path.join(base_dir, keeper))
+        inodes = {(st.st_dev, st.st_ino)}
+        for rel_path in copies:
+            st = os.stat(os.path.join(base_dir, rel_path))
+            if (st.st_dev, st.st_ino) not in inodes:
+                inodes.add((st.st_dev, st.st_ino))
+                total += fingerprints[rel_path]['size']
+    return total
+
+def print_groups(title, groups, fingerprints, show_distance=False):
+    print(f"{title}: {len(groups)} grupos")
+    print("-" * 80)
+    for keeper, *copies in groups:
+        print(f"  ✅ {keeper}")
+        for rel_path in copies:
+            detail = ''
+            if show_distance:
+                distance = hamming(int(fingerprints[keeper]['dhash'], 16), int(fingerprints[rel_path]['dhash'], 16))
+                detail = f" ({distance} bits)"
+            print(f"     ♻️  {rel_path}{detail}")
+    print()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Encontra imagens duplicadas (exatas e quase iguais)')
+    parser.add_argument('--distance', type=int, default=MAX_DISTANCE, metavar='BITS',
+                        help=f'bits diferentes no dHash para considerar quase iguais (padrão: {MAX_DISTANCE}; 0 a 64)')
+    parser.add_argument('--jobs', type=int, default=None, metavar='N',
+                        help='processos para calcular as impressões digitais (padrão: um por CPU)')
+    parser.add_argument('--json', metavar='ARQUIVO', help='grava o relatório em JSON neste arquivo')
+    parser.add_argument('--link', action='store_true',
+                        help='troca as cópias exatas por hard links para a cópia mantida')
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    rel_paths = list_images(base_dir)
+    print(f"🔍 {len(rel_paths)} imagens (categorias e {OLD_IMAGES_DIR}/)")
+    fingerprints, stats = fingerprint_images(base_dir, rel_paths, jobs=args.jobs)
+    print(f"🧩 Impressões digitais: {stats['read']} calculadas, {stats['reused']} do cache "
+          f"({stats['seconds']:.2f}s)")
+    print()
+
+    exact, near = find_duplicates(fingerprints, args.distance)
+    wasted = wasted_bytes(base_dir, exact, fingerprints)
+    print_groups("CÓPIAS EXATAS (SHA-256)", exact, fingerprints)
+    print_groups(f"QUASE IGUAIS (dHash, até {args.distance} bits)", near, fingerprints, show_distance=True)
+
+    print(f"📊 {sum(len(group) - 1 for group in exact)} cópias exatas ({format_size(wasted)} a liberar), "
+          f"{sum(len(group) - 1 for group in near)} quase iguais")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'distance': args.distance,
+                'stats': stats,
+                'wasted_bytes': wasted,
+                'exact': exact,
+                'near': near,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"✅ Relatório gravado em {args.json}")
+
+    if args.link and wasted:
+        print()
+        print("🔄 CRIANDO HARD LINKS:")
+        print("-" * 80)
+        linked, freed = link_duplicates(base_dir, exact, fingerprints)
+        save_index(base_dir, FINGERPRINT_INDEX, fingerprints)
+        print()
+        print(f"✅ {linked} cópias trocadas por hard links ({format_size(freed)} liberados)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,97 @@
 #!/usr/bin/env python3
+"""
+Gera o catálogo HTML (index.html) a partir das pastas de imagens.
+
+Pode ser executado (python3 generate_catalog.py --help) ou importado, sem
+efeitos colaterais, por outras ferramentas e processos de longa duração:
+
+    import generate_catalog as gc
+
+    catalog = gc.scan(base_dir)                 # Catalog com Items já ordenados
+    chunks = gc.render(catalog, gc.load_template(base_dir))
+    gc.write(catalog, chunks)                   # index.html + manifesto
+
+Módulos pesados e opcionais (argparse, tempfile, Pillow, brotli) só são
+importados quando usados.
+"""
 import os
+import io
+import sys
 import json
+import time
+import hashlib
+import contextlib
+import functools
 from urllib.parse import quote
 import urllib.parse
 import re
+import zlib
+
+from catalog_images import (THUMBNAIL_SIZE, VARIANT_WIDTHS, ensure_placeholders, file_digest,
+                            image_dimensions, variant_name, atomic_write as write_atomically)
+
+# Manifesto com o estado do último scan (mtimes das pastas, estado das imagens
+# e HTML já renderizado de cada categoria). Permite rebuilds incrementais.
+MANIFEST_NAME = '.catalog-manifest.json'
+MANIFEST_VERSION = 1
+
+# Modos de saída, guardados no manifesto e mantidos nos builds seguintes:
+# - compact: subcategorias montadas no navegador (ver render_category)
+# - sharded: index.html só com a sidebar; seções em catalog/*.html (ver render_shards)
+BUILD_OPTIONS = {'compact': False, 'sharded': False}
+
+# Pasta dos fragmentos HTML do modo sharded
+SHARDS_DIR = 'catalog'
+
+# Índice de busca (termos sem acento → itens), baixado pelo navegador na primeira busca
+SEARCH_INDEX_NAME = 'search-index.json'
+SEARCH_TOKEN = re.compile(r'[^\W_]+')
+
+# Contagem de itens por categoria e subcategoria, regravada a cada build, para
+# outras ferramentas (ou o server.js) lerem os números sem percorrer as pastas
+SUMMARY_NAME = 'catalog-summary.json'
+
+# Campos de cada item no --export (JSON Lines ou CSV)
+EXPORT_FIELDS = ('category', 'subcategory', 'name', 'path', 'thumbnail', 'size', 'width', 'height')
+
+# Casca estática da página (CSS, JS, modais) com os slots <!-- slot:nome -->
+# onde entram a sidebar e o conteúdo. As posições dos slots ficam em cache,
+# junto com o hash do template, para não reprocessar o arquivo a cada build.
+TEMPLATE_NAME = 'index.template.html'
+TEMPLATE_CACHE_NAME = '.catalog-template.json'
+TEMPLATE_SLOTS = ('sidebar', 'content')
+SLOT_PATTERN = re.compile(r'<!-- slot:([a-z]+) -->')
+
+# Lock exclusivo e fila de pedidos de build (execuções simultâneas viram um ciclo só)
+LOCK_NAME = '.catalog.lock'
+QUEUE_DIR = '.catalog-queue'
+
+# ETags (SHA-1 do conteúdo) do HTML e dos thumbnails, mais as versões
+# .gz/.br pré-comprimidas do HTML, para servir 304 e bytes já comprimidos
+ASSETS_NAME = '.catalog-assets.json'
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# Brotli 11 leva ~0,7 s no index.html inteiro: os patches do admin usam um
+# nível rápido (~5% maior) e o próximo rebuild volta ao nível máximo
+BROTLI_FAST_QUALITY = 9
+
+# Versão das imagens nas URLs (?v=): início do SHA-1 do conteúdo, já guardado
+# no manifesto (originais) e no .catalog-assets.json (thumbnails e variantes).
+# Com ela o servidor responde com cache imutável de um ano.
+ASSET_VERSION_LENGTH = 10
+
+# Extensões de imagem válidas
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+# IMPORTANTE: thumbmails é uma pasta com imagens antigas/duplicadas, não thumbnails!
+IGNORED_FOLDERS = {'node_modules', 'thumbmails', SHARDS_DIR}
+IGNORED_SUFFIXES = ('.html', '.js', '.json', '.py', '.sh', '.md')
+
+# Contadores do scan (somados por categoria, inclusive nas threads do --jobs):
+# pastas relidas e reaproveitadas, chamadas de stat, imagens cujo hash foi
+# recalculado e imagens com/sem thumbnail nas pastas relidas
+SCAN_COUNTERS = ('scanned', 'reused', 'stat_calls', 'hashed', 'thumbnail_hits', 'thumbnail_misses')
+
 
 def natural_sort_key(s):
     """
@@ -24,91 +112,600 @@ def url_encode_path(path):
     # Juntar novamente com /
     return '/'.join(encoded_parts)
 
-def get_thumbnail_path(image_path, base_dir):
+def versioned_url(path, version):
     """
-    Retorna o caminho do thumbnail se existir, caso contrário retorna o caminho original
+    URL do arquivo com ?v=<versão do conteúdo>: muda quando a imagem muda,
+    então o navegador pode guardar a resposta em cache para sempre
     """
-    # Caminho absoluto do thumbnail
-    thumbnail_abs = os.path.join(base_dir, '.thumbnails', image_path)
-    if os.path.exists(thumbnail_abs):
-        # Retornar caminho relativo para usar no HTML
-        return os.path.join('.thumbnails', image_path).replace('\\', '/')
-    # Se thumbnail não existe, usar imagem original
-    return image_path.replace('\\', '/')
+    url = url_encode_path(path)
+    return f"{url}?v={version}" if version else url
 
-base_dir = os.path.dirname(os.path.abspath(__file__))
-categories = {}
+def asset_version(entry):
+    """
+    Versão de uma imagem do manifesto (sha1) ou de um arquivo do .catalog-assets.json (etag)
+    """
+    return entry.get('sha1', entry.get('etag'))[:ASSET_VERSION_LENGTH]
 
-# Extensões de imagem válidas
-image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
-
-# Percorrer todos os diretórios
-for item in sorted(os.listdir(base_dir), key=natural_sort_key):
-    item_path = os.path.join(base_dir, item)
-
-    # Ignorar arquivos ocultos, pastas especiais e arquivos
-    # IMPORTANTE: thumbmails é uma pasta com imagens antigas/duplicadas, não thumbnails!
-    if (item.startswith('.') or
-        item in ['node_modules', 'thumbmails'] or
-        item.endswith('.html') or
-        item.endswith('.js') or
-        item.endswith('.json') or
-        item.endswith('.py') or
-        item.endswith('.sh') or
-        item.endswith('.md') or
-        not os.path.isdir(item_path)):
-        continue
-
-    # Coletar imagens da pasta com estrutura de subpastas
-    for root, dirs, files in os.walk(item_path):
-        # Ignorar pastas ocultas e node_modules
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d != 'node_modules']
-        dirs.sort(key=natural_sort_key)
-
-        # Ordenar arquivos com ordenação natural
-        sorted_files = sorted(files, key=natural_sort_key)
-
-        for file in sorted_files:
-            if os.path.splitext(file.lower())[1] in image_extensions:
-                # Caminho relativo da imagem
-                rel_path = os.path.relpath(os.path.join(root, file), base_dir)
-
-                # Determinar subcategoria se houver
-                rel_to_category = os.path.relpath(root, item_path)
-                subcategory = rel_to_category if rel_to_category != '.' else None
-
-                if item not in categories:
-                    categories[item] = {}
-
-                if subcategory:
-                    if subcategory not in categories[item]:
-                        categories[item][subcategory] = []
-                    categories[item][subcategory].append({
-                        'filename': file,
-                        'path': rel_path,
-                        'thumbnail': get_thumbnail_path(rel_path, base_dir)
-                    })
+
+# ---------------------------------------------------------------------------
+# Instrumentação (--timings / --profile)
+# ---------------------------------------------------------------------------
+
+# Medidas do comando em andamento; None quando a instrumentação está desligada
+TIMINGS = None
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Soma em TIMINGS['phases'][name] o tempo de relógio e de CPU do bloco.
+    Sem --timings não mede nada.
+    """
+    if TIMINGS is None:
+        yield
+        return
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        entry = TIMINGS['phases'].setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0})
+        entry['wall_ms'] += (time.perf_counter() - wall) * 1000
+        entry['cpu_ms'] += (time.process_time() - cpu) * 1000
+
+def count(name, amount=1):
+    """Soma amount ao contador name (só com --timings)"""
+    if TIMINGS is not None:
+        TIMINGS['counters'][name] = TIMINGS['counters'].get(name, 0) + amount
+
+def timed_chunks(name, chunks):
+    """
+    Repassa os pedaços de um gerador contando como fase name só o tempo gasto
+    gerando cada um (o render corre intercalado com a gravação em streaming)
+    """
+    if TIMINGS is None:
+        return chunks
+
+    def timed():
+        iterator = iter(chunks)
+        while True:
+            with phase(name):
+                chunk = next(iterator, None)
+            if chunk is None:
+                return
+            yield chunk
+    return timed()
+
+@contextlib.contextmanager
+def instrumented(enabled=True, profile_path=None):
+    """
+    Liga a instrumentação durante o bloco e entrega o dict de medidas, que fica
+    completo ao sair dele:
+
+        {"wall_ms": ..., "cpu_ms": ...,
+         "phases": {"scan": {"wall_ms": ..., "cpu_ms": ...}, ...},
+         "counters": {"dirs_scanned": ..., "bytes_written": ..., ...}}
+
+    Com profile_path grava também um dump do cProfile do bloco
+    (python3 -m pstats <arquivo>).
+    """
+    global TIMINGS
+
+    measured = {'wall_ms': 0.0, 'cpu_ms': 0.0, 'phases': {}, 'counters': {}}
+    previous = TIMINGS
+    TIMINGS = measured if enabled else None
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield measured
+    finally:
+        measured['wall_ms'] = round((time.perf_counter() - wall) * 1000, 2)
+        measured['cpu_ms'] = round((time.process_time() - cpu) * 1000, 2)
+        for entry in measured['phases'].values():
+            for key in entry:
+                entry[key] = round(entry[key], 2)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        TIMINGS = previous
+
+def count_scan_stats(stats):
+    """Passa os contadores de um scan (SCAN_COUNTERS) para a instrumentação"""
+    names = {'scanned': 'dirs_scanned', 'reused': 'dirs_reused'}
+    for key in SCAN_COUNTERS:
+        count(names.get(key, key), stats[key])
+
+
+# ---------------------------------------------------------------------------
+# Modelo em memória
+# ---------------------------------------------------------------------------
+
+class Item:
+    """
+    Um produto do catálogo. Tratado como imutável (ver replace) e comparado
+    por valor, o que permite usá-lo como chave do cache de cards. Nome
+    exibido e URLs codificadas são derivados só quando o card é renderizado:
+    itens de seções reaproveitadas nunca pagam esse custo.
+    """
+    __slots__ = ('path', 'thumbnail', 'variants', 'dimensions', 'placeholder', 'version', 'thumbnail_versions',
+                 'source')
+
+    def __init__(self, path, thumbnail, variants=(), dimensions=(None, None), placeholder=None,
+                 version=None, thumbnail_versions=(), source=None):
+        self.path = path
+        # Cópia cujos arquivos (original, thumbnail e variantes) o card usa: a
+        # própria imagem, ou outra com o mesmo conteúdo (ver attach_sources)
+        self.source = source or path
+        self.thumbnail = thumbnail
+        self.variants = tuple(variants)
+        self.dimensions = tuple(dimensions)
+        self.placeholder = placeholder
+        # Versões (ver versioned_url): a do original e, alinhadas com
+        # (thumbnail, *variantes), as dos arquivos gerados a partir dele
+        self.version = version
+        self.thumbnail_versions = tuple(thumbnail_versions)
+
+    @property
+    def name(self):
+        return os.path.splitext(self.path.rsplit('/', 1)[-1])[0]
+
+    # Codificar caminhos para URL (necessário para Render.com). url fica sem
+    # versão porque também identifica a imagem nas APIs de renomear/deletar
+    @property
+    def url(self):
+        return url_encode_path(self.path)
+
+    @property
+    def image_url(self):
+        return versioned_url(self.source, self.version)
+
+    @property
+    def thumbnail_url(self):
+        return versioned_url(self.thumbnail, (self.thumbnail_versions or (self.version,))[0])
+
+    @property
+    def variant_urls(self):
+        versions = self.thumbnail_versions[1:] or (self.version,) * len(self.variants)
+        return tuple(versioned_url(variant_name(f'.thumbnails/{self.source}', width), version)
+                     for width, version in zip(self.variants, versions))
+
+    def fields(self):
+        return (self.path, self.thumbnail, self.variants, self.dimensions, self.placeholder,
+                self.version, self.thumbnail_versions, self.source)
+
+    def replace(self, **changes):
+        values = dict(zip(('path', 'thumbnail', 'variants', 'dimensions', 'placeholder',
+                           'version', 'thumbnail_versions', 'source'), self.fields()))
+        values.update(changes)
+        return Item(**values)
+
+    def __eq__(self, other):
+        return isinstance(other, Item) and self.fields() == other.fields()
+
+    def __hash__(self):
+        return hash(self.fields())
+
+    def __repr__(self):
+        return f"Item({self.path!r})"
+
+
+class Catalog:
+    """
+    Resultado de um scan: categories é {categoria: {subcategoria ou '__root__':
+    [Item]}}, com categorias, subcategorias e itens já em ordem natural (os
+    renderizadores não reordenam nada). manifest é o manifesto novo, que
+    write() grava; stats conta as pastas reescaneadas e reaproveitadas.
+    """
+    __slots__ = ('base_dir', 'categories', 'manifest', 'stats', 'thumbnails')
+
+    def __init__(self, base_dir, categories, manifest, stats, thumbnails=None):
+        self.base_dir = base_dir
+        self.categories = categories
+        self.manifest = manifest
+        self.stats = stats
+        # Entradas do .catalog-assets.json dos thumbnails, de attach_versions
+        self.thumbnails = thumbnails or {}
+
+    def items(self):
+        for subcats in self.categories.values():
+            for items in subcats.values():
+                yield from items
+
+    def __len__(self):
+        return sum(len(items) for subcats in self.categories.values() for items in subcats.values())
+
+    def __repr__(self):
+        return f"Catalog({self.base_dir!r}, {len(self.categories)} categorias, {len(self)} itens)"
+
+
+
+# ---------------------------------------------------------------------------
+# Manifesto
+# ---------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=None)
+def generator_digest():
+    """
+    Hash deste script e do rename_files.py (regras dos termos de busca). Se o
+    código do gerador mudar, o HTML guardado no manifesto deixa de valer e
+    tudo é renderizado de novo.
+    """
+    digest = hashlib.sha1()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in (os.path.basename(__file__), 'rename_files.py'):
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def empty_manifest():
+    return {
+        'version': MANIFEST_VERSION,
+        'generator': generator_digest(),
+        **BUILD_OPTIONS,
+        'dirs': {},
+        'images': {},
+        'sections': {},
+        'search': {},
+    }
+
+def load_manifest(base_dir):
+    """
+    Lê o manifesto do último scan. Se não existir, estiver corrompido ou tiver
+    sido gerado por outra versão do script, retorna um manifesto vazio
+    (o que equivale a um rebuild completo).
+    """
+    manifest_path = os.path.join(base_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty_manifest()
+
+    fresh = empty_manifest()
+    if (not isinstance(manifest, dict) or
+            manifest.get('version') != fresh['version'] or
+            manifest.get('generator') != fresh['generator']):
+        return fresh
+
+    for key in ('dirs', 'images', 'sections', 'search'):
+        manifest.setdefault(key, {})
+    for name, default in BUILD_OPTIONS.items():
+        manifest.setdefault(name, default)
+    return manifest
+
+def save_manifest(base_dir, manifest):
+    manifest_path = os.path.join(base_dir, MANIFEST_NAME)
+    atomic_write(manifest_path, [json.dumps(manifest, ensure_ascii=False, separators=(',', ':'))])
+
+
+# ---------------------------------------------------------------------------
+# Escrita atômica
+# ---------------------------------------------------------------------------
+
+def atomic_write(path, chunks, binary=False):
+    """
+    catalog_images.atomic_write contando os arquivos e bytes gravados (--timings)
+    """
+    size = write_atomically(path, chunks, binary=binary)
+    count('files_written')
+    count('bytes_written', size)
+
+
+# ---------------------------------------------------------------------------
+# Scan das pastas
+# ---------------------------------------------------------------------------
+
+def is_ignored_entry(name):
+    """
+    Ignora arquivos ocultos, pastas especiais e arquivos soltos na raiz
+    """
+    return (name.startswith('.') or
+            name in IGNORED_FOLDERS or
+            name.endswith(IGNORED_SUFFIXES))
+
+def is_category_folder(base_dir, item):
+    if is_ignored_entry(item):
+        return False
+    return os.path.isdir(os.path.join(base_dir, item))
+
+def mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def list_thumbnails(base_dir, rel_dir):
+    """
+    Nomes dos arquivos existentes em .thumbnails/<rel_dir>, lidos com um único
+    os.scandir (em vez de um os.path.exists por imagem)
+    """
+    try:
+        with os.scandir(os.path.join(base_dir, '.thumbnails', rel_dir)) as entries:
+            return {entry.name for entry in entries if not entry.is_dir()}
+    except OSError:
+        return set()
+
+def scan_folder(base_dir, rel_dir, old_manifest, manifest, stats, hash=True):
+    """
+    Lê uma pasta (e suas subpastas) e registra o estado dela no manifesto.
+
+    Se o mtime da pasta e o da pasta correspondente em .thumbnails não mudaram
+    desde o último scan, a lista de arquivos é reaproveitada do manifesto sem
+    listar a pasta nem consultar os arquivos um a um. Numa pasta relida, as
+    dimensões e o hash de cada imagem também são reaproveitados enquanto o
+    tamanho e o mtime do arquivo forem os mesmos; senão as dimensões são lidas
+    só do cabeçalho e o hash é recalculado. Com hash=False (export, que não
+    usa o hash) as imagens novas ou alteradas ficam com sha1 None.
+
+    Retorna uma lista de (pasta relativa, [nomes de imagens]) em ordem natural.
+    """
+    abs_dir = os.path.join(base_dir, rel_dir)
+    dir_mtime = mtime_ns(abs_dir)
+    thumb_mtime = mtime_ns(os.path.join(base_dir, '.thumbnails', rel_dir))
+    stats['stat_calls'] += 2
+
+    cached = old_manifest['dirs'].get(rel_dir)
+    reusable = (cached is not None and
+                cached['mtime'] == dir_mtime and
+                cached['thumb_mtime'] == thumb_mtime and
+                all(f"{rel_dir}/{name}" in old_manifest['images'] for name in cached['files']))
+
+    if reusable:
+        files = cached['files']
+        subdirs = cached['subdirs']
+        for name in files:
+            rel_path = f"{rel_dir}/{name}"
+            manifest['images'][rel_path] = old_manifest['images'][rel_path]
+        stats['reused'] += 1
+    else:
+        files = []
+        subdirs = []
+        images = {}
+        thumbnails = list_thumbnails(base_dir, rel_dir) if thumb_mtime is not None else set()
+
+        # os.scandir já traz o tipo de cada entrada, sem um stat extra por arquivo
+        with os.scandir(abs_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Ignorar pastas ocultas e node_modules
+                    if not entry.name.startswith('.') and entry.name != 'node_modules':
+                        subdirs.append(entry.name)
+                elif os.path.splitext(entry.name.lower())[1] in IMAGE_EXTENSIONS:
+                    st = entry.stat()
+                    stats['stat_calls'] += 1
+                    files.append(entry.name)
+                    previous = old_manifest['images'].get(f"{rel_dir}/{entry.name}")
+                    if (previous is not None and
+                            previous['size'] == st.st_size and
+                            previous['mtime'] == st.st_mtime_ns):
+                        dimensions = (previous['width'], previous['height'])
+                        digest = previous['sha1']
+                    else:
+                        dimensions = image_dimensions(entry.path) or (None, None)
+                        digest = None
+                        if hash:
+                            digest = file_digest(entry.path)
+                            stats['hashed'] += 1
+                    if entry.name in thumbnails:
+                        stats['thumbnail_hits'] += 1
+                    else:
+                        stats['thumbnail_misses'] += 1
+                    images[entry.name] = {
+                        'size': st.st_size,
+                        'mtime': st.st_mtime_ns,
+                        'sha1': digest,
+                        'width': dimensions[0],
+                        'height': dimensions[1],
+                        'thumbnail': entry.name in thumbnails,
+                        # Larguras das variantes WebP existentes (generate_catalog.py --thumbnails)
+                        'variants': [width for width in VARIANT_WIDTHS
+                                     if variant_name(entry.name, width) in thumbnails],
+                    }
+
+        # Ordenar arquivos e pastas com ordenação natural
+        files.sort(key=natural_sort_key)
+        subdirs.sort(key=natural_sort_key)
+
+        for name in files:
+            manifest['images'][f"{rel_dir}/{name}"] = images[name]
+        stats['scanned'] += 1
+
+    manifest['dirs'][rel_dir] = {
+        'mtime': dir_mtime,
+        'thumb_mtime': thumb_mtime,
+        'files': files,
+        'subdirs': subdirs,
+    }
+
+    folders = [(rel_dir, files)]
+    for subdir in subdirs:
+        folders.extend(scan_folder(base_dir, f"{rel_dir}/{subdir}", old_manifest, manifest, stats, hash=hash))
+    return folders
+
+def scan_category(base_dir, category_name, old_manifest, manifest, stats):
+    """
+    Monta a estrutura {subcategoria ou '__root__': [Item]} de uma categoria,
+    com as subcategorias em ordem natural
+    """
+    subcats = {}
+    for rel_dir, files in scan_folder(base_dir, category_name, old_manifest, manifest, stats):
+        # Determinar subcategoria se houver
+        subcategory = rel_dir[len(category_name) + 1:] or '__root__'
+
+        for name in files:
+            rel_path = f"{rel_dir}/{name}"
+            image = manifest['images'][rel_path]
+            # O placeholder é preenchido por attach_placeholders
+            subcats.setdefault(subcategory, []).append(Item(
+                rel_path, version=asset_version(image), **served_files(rel_path, image)))
+    return {name: subcats[name] for name in sorted(subcats, key=natural_sort_key)}
+
+def served_files(rel_path, image):
+    """
+    Campos do Item com os arquivos que o card exibe, vindos da imagem rel_path
+    do manifesto
+    """
+    return {
+        'thumbnail': f".thumbnails/{rel_path}" if image['thumbnail'] else rel_path,
+        'variants': image['variants'],
+        # Dimensões do arquivo exibido no card (thumbnails são sempre quadrados)
+        'dimensions': ((THUMBNAIL_SIZE, THUMBNAIL_SIZE) if image['thumbnail']
+                       else (image['width'], image['height'])),
+    }
+
+def duplicate_sources(images):
+    """
+    {caminho: cópia servida} das imagens do manifesto com conteúdo repetido
+    (mesmo sha1). Cada grupo aponta para uma cópia só: a primeira em ordem
+    natural, preferindo as que têm thumbnail. Imagens únicas ficam de fora.
+    """
+    by_digest = {}
+    for rel_path, image in images.items():
+        by_digest.setdefault(image['sha1'], []).append(rel_path)
+
+    sources = {}
+    for paths in by_digest.values():
+        if len(paths) < 2:
+            continue
+        source = min(paths, key=lambda rel_path: (not images[rel_path]['thumbnail'], natural_sort_key(rel_path)))
+        for rel_path in paths:
+            if rel_path != source:
+                sources[rel_path] = source
+    return sources
+
+def attach_sources(categories, manifest, sources):
+    """
+    Faz os cards de imagens repetidas (ex.: a mesma foto em duas categorias,
+    ver dedupe_images.py) usarem os arquivos da cópia servida: o navegador
+    baixa cada conteúdo uma vez só. Precisa rodar antes de attach_versions.
+    """
+    for subcats in categories.values():
+        for items in subcats.values():
+            for index, item in enumerate(items):
+                source = sources.get(item.path)
+                if source is not None:
+                    items[index] = item.replace(source=source, **served_files(source, manifest['images'][source]))
+
+def attach_placeholders(base_dir, categories, manifest, prune=False):
+    """
+    Coloca em cada item o placeholder (LQIP) da imagem, gerando os que faltam.
+    Precisa rodar antes do section_key, para que uma seção guardada sem
+    placeholder seja renderizada de novo quando ele aparecer.
+    """
+    digests = {}
+    for subcats in categories.values():
+        for items in subcats.values():
+            for item in items:
+                digests[manifest['images'][item.path]['sha1']] = item.path
+
+    placeholders = ensure_placeholders(base_dir, digests, prune=prune)
+    for subcats in categories.values():
+        for items in subcats.values():
+            items[:] = [item.replace(placeholder=placeholders.get(manifest['images'][item.path]['sha1']))
+                        for item in items]
+
+def attach_versions(base_dir, categories, manifest):
+    """
+    Coloca em cada item as versões do thumbnail e das variantes: o início da
+    ETag de cada arquivo. Assim um thumbnail regenerado ganha URL nova mesmo
+    que o original seja o mesmo.
+
+    As versões ficam na imagem do manifesto ('versions'). Numa pasta
+    reaproveitada pelo scan (mtime dela e do .thumbnails iguais) elas valem
+    sem olhar os arquivos; nas pastas relidas cada arquivo é consultado,
+    com a ETag reaproveitada do .catalog-assets.json enquanto tamanho e mtime
+    não mudam. Retorna as entradas usadas, que o write_assets grava sem olhar
+    os arquivos de novo.
+    """
+    old_assets = load_assets(base_dir)
+    entries = {}
+    for subcats in categories.values():
+        for items in subcats.values():
+            for index, item in enumerate(items):
+                if item.thumbnail == item.source:
+                    continue
+                image = manifest['images'][item.source]
+                rel_paths = [item.thumbnail] + [variant_name(item.thumbnail, width) for width in item.variants]
+                if image.get('versions') is None:
+                    versions = []
+                    for rel_path in rel_paths:
+                        try:
+                            entries[rel_path] = asset_entry(base_dir, rel_path, old_assets.get(rel_path))
+                        except FileNotFoundError:
+                            versions.append(None)
+                            continue
+                        versions.append(asset_version(entries[rel_path]))
+                    image['versions'] = versions
                 else:
-                    if '__root__' not in categories[item]:
-                        categories[item]['__root__'] = []
-                    categories[item]['__root__'].append({
-                        'filename': file,
-                        'path': rel_path,
-                        'thumbnail': get_thumbnail_path(rel_path, base_dir)
-                    })
-
-# Ler o HTML template existente
-html_path = os.path.join(base_dir, 'index.html')
-with open(html_path, 'r', encoding='utf-8') as f:
-    html_content = f.read()
-
-# Encontrar onde começa e termina o conteúdo dinâmico
-# O conteúdo dinâmico fica entre o </nav> da sidebar e o início dos modals
-content_start_marker = '<!-- CONTENT START -->'
-content_end_marker = '<!-- CONTENT END -->'
-
-# Se os marcadores não existem, vamos usar padrões
-if content_start_marker not in html_content:
+                    entries.update((rel_path, old_assets[rel_path]) for rel_path in rel_paths
+                                   if rel_path in old_assets)
+                # Arquivo ausente: fica com a versão do original
+                items[index] = item.replace(thumbnail_versions=[version or item.version
+                                                                for version in image['versions']])
+    return entries
+
+def list_categories(base_dir):
+    """
+    Nomes das pastas de categoria, em ordem natural
+    """
+    with os.scandir(base_dir) as entries:
+        return sorted((entry.name for entry in entries if not is_ignored_entry(entry.name) and entry.is_dir()),
+                      key=natural_sort_key)
+
+def scan_catalog(base_dir, old_manifest, manifest, jobs=1):
+    """
+    Percorre as pastas de categoria e monta a estrutura
+    {categoria: {subcategoria ou '__root__': [itens]}}
+
+    Com jobs > 1 as categorias são lidas em paralelo (threads), o que ajuda
+    em árvores grandes ou discos lentos, onde o tempo vai quase todo em I/O.
+    """
+    category_names = list_categories(base_dir)
+
+    def scan_one(category_name):
+        stats = dict.fromkeys(SCAN_COUNTERS, 0)
+        return scan_category(base_dir, category_name, old_manifest, manifest, stats), stats
+
+    if jobs > 1 and len(category_names) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(scan_one, category_names))
+    else:
+        results = [scan_one(category_name) for category_name in category_names]
+
+    categories = {}
+    stats = dict.fromkeys(SCAN_COUNTERS, 0)
+    for category_name, (subcats, category_stats) in zip(category_names, results):
+        if subcats:
+            categories[category_name] = subcats
+        for key in stats:
+            stats[key] += category_stats[key]
+
+    return categories, stats
+
+
+# ---------------------------------------------------------------------------
+# Template
+# ---------------------------------------------------------------------------
+
+def content_bounds(html_content):
+    """
+    Localiza o conteúdo dinâmico (as seções) dentro do HTML existente.
+    Retorna (início, fim) ou None se a estrutura não for reconhecida.
+    """
+    # O conteúdo dinâmico fica entre o </nav> da sidebar e o início dos modals
+    content_start_marker = '<!-- CONTENT START -->'
+    content_end_marker = '<!-- CONTENT END -->'
+
+    if content_start_marker in html_content:
+        # Usar marcadores explícitos
+        header_end = html_content.find(content_start_marker) + len(content_start_marker)
+        footer_start = html_content.find(content_end_marker)
+        return header_end, footer_start
+
+    # Se os marcadores não existem, vamos usar padrões
     # Procurar pelo fim da sidebar e início do main content
     sidebar_end = html_content.find('</nav>')
     if sidebar_end == -1:
@@ -119,46 +716,161 @@ if content_start_marker not in html_content:
     if modal_start == -1:
         modal_start = html_content.find('<div id="imageModal"')
 
-    # Dividir o HTML em três partes: header, content, footer
-    if sidebar_end > -1 and modal_start > -1:
-        # Encontrar o início do main-content
-        main_content_start = html_content.find('<main class="main-content"', sidebar_end)
-        if main_content_start > -1:
-            # Encontrar o final da tag de abertura
-            main_content_start = html_content.find('>', main_content_start) + 1
-            # Encontrar onde termina o main-content
-            # Procurar por </main> antes dos modals
-            search_area = html_content[main_content_start:modal_start]
-            # O main-content termina com </main> seguido de modals
-            last_closing_main = search_area.rfind('</main>')
-            if last_closing_main > -1:
-                html_header = html_content[:main_content_start]
-                content_end_pos = main_content_start + last_closing_main
-                html_footer = html_content[content_end_pos:]
-            else:
-                print("⚠️  Não foi possível identificar estrutura do HTML. Apenas contando itens.")
-                html_header = html_footer = None
-        else:
-            print("⚠️  Não foi possível identificar estrutura do HTML. Apenas contando itens.")
-            html_header = html_footer = None
+    if sidebar_end == -1 or modal_start == -1:
+        return None
+
+    # Encontrar o início do main-content
+    main_content_start = html_content.find('<main class="main-content"', sidebar_end)
+    if main_content_start == -1:
+        return None
+
+    # Encontrar o final da tag de abertura
+    main_content_start = html_content.find('>', main_content_start) + 1
+    # O main-content termina com </main> seguido de modals
+    content_end_pos = html_content.rfind('</main>', main_content_start, modal_start)
+    if content_end_pos == -1:
+        return None
+
+    return main_content_start, content_end_pos
+
+def split_template(html_content):
+    """
+    Divide o HTML existente em cabeçalho e rodapé, em volta do conteúdo dinâmico.
+    Retorna (None, None) se a estrutura não for reconhecida.
+    """
+    bounds = content_bounds(html_content)
+    if bounds is None:
+        return None, None
+    return html_content[:bounds[0]], html_content[bounds[1]:]
+
+def sidebar_bounds(html_content):
+    """
+    Localiza a lista de links dentro da <nav class="sidebar-nav">.
+    Retorna (início, fim) ou None.
+    """
+    nav_start = html_content.find('<nav class="sidebar-nav">')
+    if nav_start == -1:
+        return None
+    nav_end = html_content.find('</nav>', nav_start)
+    if nav_end == -1:
+        return None
+    return nav_start, nav_end
+
+def extract_template(html_content):
+    """
+    Monta o template (casca com slots) a partir de um index.html já gerado.
+    Usado só na primeira vez, quando o index.template.html ainda não existe.
+    Retorna None se a estrutura não for reconhecida.
+    """
+    html_header, html_footer = split_template(html_content)
+    if html_header is None or sidebar_bounds(html_header) is None:
+        return None
+
+    # Sidebar: conteúdo da <nav> vira o slot, dentro da <ul> da lista de categorias
+    html_header = replace_sidebar(html_header, ['<!-- slot:sidebar -->'])
+
+    # Conteúdo: marcadores explícitos em volta do slot (usados pelo patch)
+    if not html_header.endswith('<!-- CONTENT START -->'):
+        html_header += '\n            <!-- CONTENT START -->'
+    if not html_footer.startswith('<!-- CONTENT END -->'):
+        html_footer = '<!-- CONTENT END -->\n        ' + html_footer
+    return html_header + '<!-- slot:content -->\n            ' + html_footer
+
+def parse_template(text):
+    """
+    Posições dos slots no texto do template: [(nome, início, fim), ...].
+    Retorna None se faltar algum dos TEMPLATE_SLOTS.
+    """
+    slots = [(match.group(1), match.start(), match.end()) for match in SLOT_PATTERN.finditer(text)]
+    if sorted(name for name, _, _ in slots) != sorted(TEMPLATE_SLOTS):
+        return None
+    return slots
+
+def load_template(base_dir):
+    """
+    Lê o index.template.html e o divide nos slots: retorna a lista
+    [texto, 'sidebar', texto, 'content', texto] que o render() percorre, ou
+    None se o template não tiver os slots. Se o template ainda não existe, ele
+    é extraído do index.html atual uma única vez.
+
+    Enquanto o tamanho e o mtime do template não mudam, as posições dos slots
+    vêm do cache (.catalog-template.json) e o texto não é varrido de novo.
+    """
+    template_path = os.path.join(base_dir, TEMPLATE_NAME)
+    if not os.path.exists(template_path):
+        with open(os.path.join(base_dir, 'index.html'), 'r', encoding='utf-8') as f:
+            text = extract_template(f.read())
+        if text is None:
+            return None
+        atomic_write(template_path, [text])
+        print(f"🧩 Template extraído do index.html para {TEMPLATE_NAME}")
+
+    with open(template_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    st = os.stat(template_path)
+
+    cache_path = os.path.join(base_dir, TEMPLATE_CACHE_NAME)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = None
+
+    if (isinstance(cache, dict) and cache.get('size') == st.st_size and
+            cache.get('mtime') == st.st_mtime_ns):
+        slots = cache['slots']
     else:
-        print("⚠️  Não foi possível identificar estrutura do HTML. Apenas contando itens.")
-        html_header = html_footer = None
-else:
-    # Usar marcadores explícitos
-    header_end = html_content.find(content_start_marker) + len(content_start_marker)
-    footer_start = html_content.find(content_end_marker)
-    html_header = html_content[:header_end]
-    html_footer = html_content[footer_start:]
-
-# Gerar o conteúdo HTML das categorias
-html_categories = []
-
-# Gerar links da sidebar
-sidebar_links = []
-for category_name in sorted(categories.keys(), key=natural_sort_key):
+        slots = parse_template(text)
+        if slots is None:
+            return None
+        atomic_write(cache_path, [json.dumps({
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'sha1': hashlib.sha1(text.encode('utf-8')).hexdigest(),
+            'slots': slots,
+        })])
+
+    pieces = []
+    position = 0
+    for name, start, end in slots:
+        pieces += [text[position:start], name]
+        position = end
+    pieces.append(text[position:])
+    return pieces
+
+def replace_sidebar(html_header, sidebar_links):
+    """
+    Substitui o conteúdo da <nav class="sidebar-nav"> pelos links gerados
+    """
+    bounds = sidebar_bounds(html_header)
+    if bounds is None:
+        return html_header
+    nav_start, nav_end = bounds
+
+    # Encontrar onde começa o conteúdo da nav (depois da tag de abertura completa)
+    content_start = html_header.find('>', nav_start) + 1
+    # Substituir o conteúdo da nav, envolvendo em <ul class="category-list">
+    sidebar_content = '\n                <ul class="category-list" id="categoryList">\n' + ''.join(sidebar_links) + '\n                </ul>\n            '
+    return html_header[:content_start] + sidebar_content + html_header[nav_end:]
+
+
+# ---------------------------------------------------------------------------
+# Renderização
+# ---------------------------------------------------------------------------
+
+def render_sidebar(categories):
+    """
+    Gera os links da sidebar (um bloco por categoria)
+    """
+    return [render_sidebar_entry(category_name, subcats)
+            for category_name, subcats in categories.items()]
+
+def render_sidebar_entry(category_name, subcats):
+    """
+    Gera o link de uma categoria na sidebar (com as subcategorias, se houver)
+    """
+    sidebar_links = []
     category_id = quote(category_name)
-    subcats = categories[category_name]
 
     # Se tem apenas __root__, é categoria simples
     if len(subcats) == 1 and '__root__' in subcats:
@@ -184,11 +896,11 @@ for category_name in sorted(categories.keys(), key=natural_sort_key):
                         <ul class="subcategory-list">''')
 
         # Adicionar subcategorias
-        for subcat_name in sorted([k for k in subcats.keys() if k != '__root__'], key=natural_sort_key):
+        for subcat_name in [k for k in subcats if k != '__root__']:
             subcat_id = quote(f"{category_name}/{subcat_name}")
             item_count = len(subcats[subcat_name])
             sidebar_links.append(f'''
-                            <li class="subcategory-item">
+                            <li class="subcategory-item" data-category="{category_name}" data-subcategory="{subcat_name}">
                                 <a href="#{subcat_id}" class="subcategory-link" onclick="showSection('{subcat_id}', event)">
                                     {subcat_name} ({item_count})
                                 </a>
@@ -198,18 +910,67 @@ for category_name in sorted(categories.keys(), key=natural_sort_key):
                         </ul>
                     </li>''')
 
-# Gerar seções de conteúdo
-content_sections = []
-for category_name in sorted(categories.keys(), key=natural_sort_key):
-    category_id = quote(category_name)
-    subcats = categories[category_name]
+    return ''.join(sidebar_links)
 
-    # Se tem apenas __root__, é categoria simples
-    if len(subcats) == 1 and '__root__' in subcats:
-        items = subcats['__root__']
-        item_count = len(items)
+# Largura exibida dos cards (ver .image-grid no index.html), para o srcset
+CARD_SIZES = '(max-width: 768px) 50vw, 300px'
 
-        content_sections.append(f'''
+def render_image(item):
+    """
+    <img> do card; com variantes WebP vira um <picture> com srcset.
+    width/height dão ao navegador a proporção antes de a imagem carregar.
+    """
+    width, height = item.dimensions
+    size = f' width="{width}" height="{height}"' if width and height else ''
+    img = f'<img src="{item.thumbnail_url}" alt="{item.name}"{size} loading="lazy">'
+    if not item.variants:
+        return img
+
+    srcset = ', '.join(f"{url} {width}w" for width, url in zip(item.variants, item.variant_urls))
+    return f'''<picture>
+                                <source type="image/webp" srcset="{srcset}" sizes="{CARD_SIZES}">
+                                {img}
+                            </picture>'''
+
+@functools.lru_cache(maxsize=65536)
+def render_card(item):
+    """
+    Gera o card de um produto. Memoizado pelo Item: o mesmo card aparece na
+    seção agregada da categoria e na seção da subcategoria.
+    """
+    name = item.name
+    img_path = item.url
+    image_url = item.image_url
+    image = render_image(item)
+    # Placeholder borrado como fundo do wrapper: o grid pinta antes de a imagem chegar
+    wrapper_style = f' style="background-image: url({item.placeholder})"' if item.placeholder else ''
+
+    return f'''
+                    <div class="image-card" onclick="openModal('{image_url}', '{name}')">
+                        <button class="edit-btn" onclick="openRenameModal('{img_path}', '{name}', event)" title="Renomear produto">
+                            ✏️
+                        </button>
+                        <button class="delete-btn" onclick="openDeleteModal('{img_path}', '{name}', event)" title="Deletar produto">
+                            ✕
+                        </button>
+                        <div class="image-wrapper"{wrapper_style}>
+                            {image}
+                        </div>
+                        <div class="image-info">
+                            <div class="image-name" title="{name}">{name}</div>
+                        </div>
+                    </div>'''
+
+def render_cards(items):
+    return ''.join(render_card(item) for item in items)
+
+def render_simple_section(category_name, items):
+    """
+    Seção de uma categoria sem subcategorias (ou dos itens na raiz dela)
+    """
+    category_id = quote(category_name)
+    item_count = len(items)
+    return f'''
             <section class="section" id="{category_id}" data-category="{category_name}">
                 <div class="section-header">
                     <div class="section-header-info">
@@ -220,41 +981,32 @@ for category_name in sorted(categories.keys(), key=natural_sort_key):
                         ➕ Adicionar Produto
                     </button>
                 </div>
-                <div class="image-grid">''')
+                <div class="image-grid">{render_cards(items)}
+                </div>
+            </section>'''
 
-        # Adicionar itens
-        for item in items:
-            filename = os.path.splitext(item['filename'])[0]
-            # Codificar caminhos para URL (necessário para Render.com)
-            img_path = url_encode_path(item['path'].replace('\\', '/'))
-            thumb_path = url_encode_path(item['thumbnail'].replace('\\', '/'))
+def render_category(category_name, subcats, compact=False):
+    """
+    Gera as seções de conteúdo de uma categoria.
 
-            content_sections.append(f'''
-                    <div class="image-card" onclick="openModal('{img_path}', '{filename}')">
-                        <button class="edit-btn" onclick="openRenameModal('{img_path}', '{filename}', event)" title="Renomear produto">
-                            ✏️
-                        </button>
-                        <button class="delete-btn" onclick="openDeleteModal('{img_path}', '{filename}', event)" title="Deletar produto">
-                            ✕
-                        </button>
-                        <div class="image-wrapper">
-                            <img src="{thumb_path}" alt="{filename}" loading="lazy">
-                        </div>
-                        <div class="image-info">
-                            <div class="image-name" title="{filename}">{filename}</div>
-                        </div>
-                    </div>''')
+    Com compact=True as seções individuais de cada subcategoria não são
+    geradas: o navegador monta cada uma sob demanda a partir do bloco
+    correspondente na seção agregada (ver deriveSubcategorySection no
+    index.html), e cada card sai uma única vez no HTML.
+    """
+    # Se tem apenas __root__, é categoria simples
+    if len(subcats) == 1 and '__root__' in subcats:
+        return render_simple_section(category_name, subcats['__root__'])
 
-        content_sections.append('''
-                </div>
-            </section>''')
+    content_sections = []
+    category_id = quote(category_name)
+    subcat_names = [k for k in subcats if k != '__root__']
 
-    else:
-        # Categoria com subcategorias
-        # Criar uma seção agregada que mostra TODAS as subcategorias juntas
-        total_items = sum(len(items) for subcat, items in subcats.items() if subcat != '__root__')
+    # Categoria com subcategorias
+    # Criar uma seção agregada que mostra TODAS as subcategorias juntas
+    total_items = sum(len(items) for subcat, items in subcats.items() if subcat != '__root__')
 
-        content_sections.append(f'''
+    content_sections.append(f'''
             <section class="section" id="{category_id}" data-category="{category_name}">
                 <div class="section-header">
                     <div class="section-header-info">
@@ -263,14 +1015,15 @@ for category_name in sorted(categories.keys(), key=natural_sort_key):
                     </div>
                 </div>''')
 
-        # Adicionar cada subcategoria como um bloco dentro da seção agregada
-        for subcat_name in sorted([k for k in subcats.keys() if k != '__root__'], key=natural_sort_key):
-            items = subcats[subcat_name]
-            item_count = len(items)
-            full_path = f"{category_name}/{subcat_name}"
+    # Adicionar cada subcategoria como um bloco dentro da seção agregada
+    for subcat_name in subcat_names:
+        items = subcats[subcat_name]
+        item_count = len(items)
+        subcat_id = quote(f"{category_name}/{subcat_name}")
+        full_path = f"{category_name}/{subcat_name}"
 
-            content_sections.append(f'''
-                <div style="margin-bottom: 40px;">
+        content_sections.append(f'''
+                <div class="subcategory-block" style="margin-bottom: 40px;" data-section-id="{subcat_id}" data-category="{category_name}" data-subcategory="{subcat_name}">
                     <div class="section-header">
                         <div class="section-header-info">
                             <h3 style="font-size: 1.3rem; color: #2c3e50; margin-bottom: 10px;">{subcat_name}</h3>
@@ -280,39 +1033,16 @@ for category_name in sorted(categories.keys(), key=natural_sort_key):
                             ➕ Adicionar Produto
                         </button>
                     </div>
-                    <div class="image-grid">''')
-
-            # Adicionar itens desta subcategoria
-            for item in items:
-                filename = os.path.splitext(item['filename'])[0]
-                img_path = url_encode_path(item['path'].replace('\\', '/'))
-                thumb_path = url_encode_path(item['thumbnail'].replace('\\', '/'))
-
-                content_sections.append(f'''
-                        <div class="image-card" onclick="openModal('{img_path}', '{filename}')">
-                            <button class="edit-btn" onclick="openRenameModal('{img_path}', '{filename}', event)" title="Renomear produto">
-                                ✏️
-                            </button>
-                            <button class="delete-btn" onclick="openDeleteModal('{img_path}', '{filename}', event)" title="Deletar produto">
-                                ✕
-                            </button>
-                            <div class="image-wrapper">
-                                <img src="{thumb_path}" alt="{filename}" loading="lazy">
-                            </div>
-                            <div class="image-info">
-                                <div class="image-name" title="{filename}">{filename}</div>
-                            </div>
-                        </div>''')
-
-            content_sections.append('''
+                    <div class="image-grid">{render_cards(items)}
                     </div>
                 </div>''')
 
-        content_sections.append('''
+    content_sections.append('''
             </section>''')
 
-        # Agora gerar seções individuais para cada subcategoria (para quando clicar em uma subcategoria específica)
-        for subcat_name in sorted([k for k in subcats.keys() if k != '__root__'], key=natural_sort_key):
+    # Agora gerar seções individuais para cada subcategoria (para quando clicar em uma subcategoria específica)
+    if not compact:
+        for subcat_name in subcat_names:
             items = subcats[subcat_name]
             item_count = len(items)
             subcat_id = quote(f"{category_name}/{subcat_name}")
@@ -329,107 +1059,1194 @@ for category_name in sorted(categories.keys(), key=natural_sort_key):
                         ➕ Adicionar Produto
                     </button>
                 </div>
-                <div class="image-grid">''')
+                <div class="image-grid">{render_cards(items)}
+                </div>
+            </section>''')
 
-            # Adicionar itens
-            for item in items:
-                filename = os.path.splitext(item['filename'])[0]
-                img_path = url_encode_path(item['path'].replace('\\', '/'))
-                thumb_path = url_encode_path(item['thumbnail'].replace('\\', '/'))
+    # Se tem itens na raiz
+    if '__root__' in subcats:
+        content_sections.append(render_simple_section(category_name, subcats['__root__']))
 
-                content_sections.append(f'''
-                    <div class="image-card" onclick="openModal('{img_path}', '{filename}')">
-                        <button class="edit-btn" onclick="openRenameModal('{img_path}', '{filename}', event)" title="Renomear produto">
-                            ✏️
-                        </button>
-                        <button class="delete-btn" onclick="openDeleteModal('{img_path}', '{filename}', event)" title="Deletar produto">
-                            ✕
-                        </button>
-                        <div class="image-wrapper">
-                            <img src="{thumb_path}" alt="{filename}" loading="lazy">
-                        </div>
-                        <div class="image-info">
-                            <div class="image-name" title="{filename}">{filename}</div>
-                        </div>
-                    </div>''')
+    return ''.join(content_sections)
 
-            content_sections.append('''
-                </div>
-            </section>''')
+def section_key(subcats):
+    """
+    Impressão digital dos itens de uma categoria (decide se o HTML guardado ainda vale)
+    """
+    payload = json.dumps({name: [item.fields() for item in items] for name, items in subcats.items()},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
 
-        # Se tem itens na raiz
-        if '__root__' in subcats:
-            items = subcats['__root__']
-            item_count = len(items)
+def render_content(categories, old_sections, manifest, stats):
+    """
+    Gerador com o HTML de cada categoria, reaproveitando as seções do manifesto
+    anterior cujos itens não mudaram. Conta em stats['rendered'] as categorias
+    renderizadas de novo.
+    """
+    for category_name, subcats in categories.items():
+        key = section_key(subcats)
+        cached = old_sections.get(category_name)
+        if cached is not None and cached['key'] == key:
+            html = cached['html']
+        else:
+            html = render_category(category_name, subcats, compact=manifest['compact'])
+            stats['rendered'] += 1
+        manifest['sections'][category_name] = {'key': key, 'html': html}
+        yield html
 
-            content_sections.append(f'''
-            <section class="section" id="{category_id}" data-category="{category_name}">
-                <div class="section-header">
-                    <div class="section-header-info">
-                        <h2>{category_name}</h2>
-                        <span class="item-count">{item_count} {' item' if item_count == 1 else 'itens'}</span>
-                    </div>
-                    <button class="add-product-btn" onclick="openProductModal('{category_name}')">
-                        ➕ Adicionar Produto
-                    </button>
-                </div>
-                <div class="image-grid">''')
+def shard_filename(category_name, html):
+    """
+    Nome do fragmento de uma categoria, com hash do conteúdo: um fragmento que
+    não mudou mantém o nome e continua válido no cache do navegador
+    """
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', category_name).strip('-') or 'categoria'
+    digest = hashlib.sha1(html.encode('utf-8')).hexdigest()[:10]
+    return f"{slug}.{digest}.html"
 
-            # Adicionar itens
-            for item in items:
-                filename = os.path.splitext(item['filename'])[0]
-                img_path = url_encode_path(item['path'].replace('\\', '/'))
-                thumb_path = url_encode_path(item['thumbnail'].replace('\\', '/'))
+def render_shards(base_dir, categories, old_sections, manifest, stats):
+    """
+    Modo sharded: grava as seções de cada categoria em catalog/<categoria>.<hash>.html
+    e gera, como conteúdo do index.html, apenas o mapa seção → fragmento que o
+    showSection usa para baixar cada categoria na primeira visita.
+    Conta em stats['rendered'] as categorias renderizadas de novo.
+    """
+    shards_path = os.path.join(base_dir, SHARDS_DIR)
+    os.makedirs(shards_path, exist_ok=True)
 
-                content_sections.append(f'''
-                    <div class="image-card" onclick="openModal('{img_path}', '{filename}')">
-                        <button class="edit-btn" onclick="openRenameModal('{img_path}', '{filename}', event)" title="Renomear produto">
-                            ✏️
-                        </button>
-                        <button class="delete-btn" onclick="openDeleteModal('{img_path}', '{filename}', event)" title="Deletar produto">
-                            ✕
-                        </button>
-                        <div class="image-wrapper">
-                            <img src="{thumb_path}" alt="{filename}" loading="lazy">
-                        </div>
-                        <div class="image-info">
-                            <div class="image-name" title="{filename}">{filename}</div>
-                        </div>
-                    </div>''')
+    shard_map = {}
+    for category_name, subcats in categories.items():
+        key = section_key(subcats)
+        cached = old_sections.get(category_name)
+        if (cached is not None and cached['key'] == key and
+                os.path.exists(os.path.join(shards_path, cached['shard']))):
+            filename = cached['shard']
+        else:
+            # Os fragmentos saem sempre no modo compacto: as subcategorias são
+            # montadas no navegador a partir da seção agregada
+            html = render_category(category_name, subcats, compact=True)
+            filename = shard_filename(category_name, html)
+            atomic_write(os.path.join(shards_path, filename), [html])
+            stats['rendered'] += 1
+        manifest['sections'][category_name] = {'key': key, 'shard': filename}
 
-            content_sections.append('''
-                </div>
-            </section>''')
+        url = f"{SHARDS_DIR}/{url_encode_path(filename)}"
+        shard_map[quote(category_name)] = url
+        for subcat_name in subcats:
+            if subcat_name != '__root__':
+                shard_map[quote(f"{category_name}/{subcat_name}")] = url
+
+    remove_shards(base_dir, keep={section['shard'] for section in manifest['sections'].values()})
+
+    payload = json.dumps(shard_map, ensure_ascii=False).replace('</', '<\\/')
+    yield f'''
+            <script type="application/json" id="catalogShards">{payload}</script>'''
+
+
+def remove_shards(base_dir, keep=()):
+    """
+    Apaga de catalog/ os fragmentos que não estão em keep (e suas versões
+    comprimidas). Sem keep (build não sharded), apaga também a pasta vazia.
+    """
+    shards_path = os.path.join(base_dir, SHARDS_DIR)
+    try:
+        with os.scandir(shards_path) as entries:
+            for entry in entries:
+                name = re.sub(r'\.(gz|br)$', '', entry.name)
+                if name.endswith('.html') and name not in keep:
+                    os.remove(entry.path)
+    except FileNotFoundError:
+        return
+    if not keep:
+        with contextlib.suppress(OSError):
+            os.rmdir(shards_path)
+
+
+# ---------------------------------------------------------------------------
+# Índice de busca
+# ---------------------------------------------------------------------------
+
+def search_tokens(rel_path):
+    """
+    Termos de busca de uma imagem: palavras do caminho (categoria, subcategoria
+    e nome, sem a extensão) em minúsculas e sem acentos, com as mesmas regras
+    do rename_files.remove_accents
+    """
+    from rename_files import remove_accents
+
+    text = remove_accents(os.path.splitext(rel_path)[0]).lower()
+    return sorted(set(SEARCH_TOKEN.findall(text)))
+
+def search_fold_table():
+    """
+    Tabela caractere → versão normalizada para o navegador aplicar na consulta
+    as mesmas regras usadas nos termos do índice
+    """
+    from rename_files import ACCENT_TABLE, remove_accents
+
+    fold = {}
+    for code in ACCENT_TABLE:
+        char = chr(code)
+        folded = remove_accents(char).lower()
+        if folded != char.lower():
+            fold[char] = folded
+    return fold
+
+def index_search(manifest, old_search):
+    """
+    Termos de cada imagem do manifesto (manifest['search']). Só as imagens
+    que não estavam no índice anterior são tokenizadas.
+    """
+    manifest['search'] = {rel_path: old_search[rel_path] if rel_path in old_search else search_tokens(rel_path)
+                          for rel_path in manifest['images']}
+
+def write_search_index(base_dir, manifest):
+    """
+    Grava o search-index.json: caminhos dos itens, termos em ordem e, para
+    cada termo, os índices dos itens que o contêm. O navegador acha os termos
+    que começam com cada palavra da consulta por busca binária, sem tocar no DOM.
+    Se o conteúdo não mudou, o arquivo não é regravado (e segue válido no cache).
+    """
+    paths = sorted(manifest['search'])
+    postings = {}
+    for index, rel_path in enumerate(paths):
+        for token in manifest['search'][rel_path]:
+            postings.setdefault(token, []).append(index)
+    terms = sorted(postings)
+
+    payload = json.dumps({
+        'version': 2,
+        'fold': search_fold_table(),
+        'paths': paths,
+        'versions': [asset_version(manifest['images'][rel_path]) for rel_path in paths],
+        'terms': terms,
+        'postings': [postings[term] for term in terms],
+    }, ensure_ascii=False, separators=(',', ':'))
+
+    index_path = os.path.join(base_dir, SEARCH_INDEX_NAME)
+    with contextlib.suppress(OSError):
+        if os.path.getsize(index_path) == len(payload.encode('utf-8')):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                if f.read() == payload:
+                    return
+    atomic_write(index_path, [payload])
+
+def split_path(rel_path):
+    """
+    (categoria, subcategoria ou '', nome do arquivo) de um caminho relativo
+    """
+    rel_dir, filename = rel_path.rsplit('/', 1)
+    category, _, subcategory = rel_dir.partition('/')
+    return category, subcategory, filename
+
+def count_items(rel_paths, counts=None):
+    """
+    Soma em counts ({categoria: {subcategoria ou '': itens}}) as imagens de rel_paths
+    """
+    counts = {} if counts is None else counts
+    for rel_path in rel_paths:
+        category, subcategory, _ = split_path(rel_path)
+        subcats = counts.setdefault(category, {})
+        subcats[subcategory] = subcats.get(subcategory, 0) + 1
+    return counts
+
+def write_summary(base_dir, counts):
+    """
+    Grava o catalog-summary.json: total de itens, e por categoria o total e
+    as contagens de cada subcategoria ('' = imagens na raiz da categoria),
+    em ordem natural. Um JSON pequeno, lido de uma vez por quem só precisa
+    dos números. Se nada mudou, o arquivo não é regravado.
+    """
+    categories = {}
+    for category in sorted(counts, key=natural_sort_key):
+        subcats = counts[category]
+        categories[category] = {
+            'total': sum(subcats.values()),
+            'subcategories': {name: subcats[name] for name in sorted(subcats, key=natural_sort_key)},
+        }
+    payload = json.dumps({
+        'version': 1,
+        'total': sum(category['total'] for category in categories.values()),
+        'categories': categories,
+    }, ensure_ascii=False, separators=(',', ':'))
+
+    summary_path = os.path.join(base_dir, SUMMARY_NAME)
+    with contextlib.suppress(OSError):
+        with open(summary_path, 'r', encoding='utf-8') as f:
+            if f.read() == payload:
+                return
+    atomic_write(summary_path, [payload])
+
+
+# ---------------------------------------------------------------------------
+# Artefatos pré-comprimidos e ETags
+# ---------------------------------------------------------------------------
+
+def read_blocks(path, size=1024 * 1024):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(size), b'')
+
+def gzip_chunks(path):
+    # wbits=31: formato gzip, com mtime zerado (mesmo conteúdo, mesmos bytes)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for block in read_blocks(path):
+        yield compressor.compress(block)
+    yield compressor.flush()
+
+def brotli_chunks(brotli, path, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for block in read_blocks(path):
+        yield compressor.process(block)
+    yield compressor.finish()
+
+# Extensão das versões comprimidas de cada codificação (ver precompress)
+COMPRESSED_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+def brotli_available():
+    import importlib.util
+
+    return importlib.util.find_spec('brotli') is not None
+
+def precompress(path, fast=False):
+    """
+    Grava path.gz e path.br ao lado do arquivo. Sem o módulo brotli
+    (pip install brotli) só o .gz é gerado, e um .br antigo é removido.
+    Retorna {codificação: tamanho}.
+    """
+    sizes = {}
+    atomic_write(path + '.gz', gzip_chunks(path), binary=True)
+    sizes['gzip'] = os.path.getsize(path + '.gz')
+
+    try:
+        import brotli
+    except ImportError:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path + '.br')
+        return sizes
+
+    quality = BROTLI_FAST_QUALITY if fast else BROTLI_QUALITY
+    atomic_write(path + '.br', brotli_chunks(brotli, path, quality), binary=True)
+    sizes['br'] = os.path.getsize(path + '.br')
+    return sizes
+
+def load_assets(base_dir):
+    try:
+        with open(os.path.join(base_dir, ASSETS_NAME), 'r', encoding='utf-8') as f:
+            assets = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return assets if isinstance(assets, dict) else {}
+
+def compressed_exist(path, previous):
+    encodings = {'gzip'} | {encoding for encoding in COMPRESSED_SUFFIXES if encoding in previous}
+    if brotli_available():
+        encodings.add('br')
+    return all(os.path.exists(path + COMPRESSED_SUFFIXES[encoding]) for encoding in encodings)
+
+def asset_entry(base_dir, rel_path, previous, compress=False, fast=False):
+    """
+    ETag (SHA-1), tamanho e mtime de um arquivo publicado. Se o arquivo não
+    mudou desde o último build, a entrada anterior é reaproveitada sem reler nada;
+    com compress, só se as versões comprimidas que ela registra (e o .br, com
+    o brotli instalado) ainda existem.
+    """
+    path = os.path.join(base_dir, rel_path)
+    st = os.stat(path)
+    count('stat_calls')
+    if (previous is not None and
+            previous['size'] == st.st_size and previous['mtime'] == st.st_mtime_ns and
+            (not compress or compressed_exist(path, previous))):
+        return previous
+
+    entry = {'etag': file_digest(path), 'size': st.st_size, 'mtime': st.st_mtime_ns}
+    if compress:
+        entry.update(precompress(path, fast=fast))
+    return entry
+
+def write_assets(base_dir, manifest, fast=False, thumbnails=None):
+    """
+    Pré-comprime o index.html e os fragmentos e grava em .catalog-assets.json
+    as ETags deles e dos thumbnails (caminho relativo → etag, tamanho, mtime
+    e tamanhos .gz/.br), para que qualquer servidor estático responda 304 e
+    entregue os bytes já comprimidos sem gastar CPU por requisição.
+    thumbnails traz as entradas já calculadas neste build (attach_versions);
+    as dos thumbnails que ele não viu (categorias fora de um patch) vêm do
+    .catalog-assets.json anterior.
+    """
+    thumbnails = thumbnails or {}
+    old_assets = load_assets(base_dir)
+    assets = {}
+
+    html_paths = ['index.html']
+    if manifest['sharded']:
+        html_paths += [f"{SHARDS_DIR}/{section['shard']}" for section in manifest['sections'].values()]
+    for rel_path in html_paths:
+        assets[rel_path] = asset_entry(base_dir, rel_path, old_assets.get(rel_path),
+                                       compress=True, fast=fast)
+
+    for rel_path, image in manifest['images'].items():
+        if not image['thumbnail']:
+            continue
+        thumbnail = f".thumbnails/{rel_path}"
+        for asset in [thumbnail] + [variant_name(thumbnail, width) for width in image['variants']]:
+            if asset in thumbnails or asset in old_assets:
+                assets[asset] = thumbnails.get(asset) or old_assets[asset]
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                assets[asset] = asset_entry(base_dir, asset, old_assets.get(asset))
+
+    atomic_write(os.path.join(base_dir, ASSETS_NAME),
+                 [json.dumps(assets, ensure_ascii=False, separators=(',', ':'))])
+    return assets
+
+
+# ---------------------------------------------------------------------------
+# Patch de seções (--add / --rename / --remove)
+# ---------------------------------------------------------------------------
+
+# Início de cada bloco gerado por render_category / render_sidebar_entry
+SECTION_START = '\n            <section class="section"'
+SIDEBAR_ITEM_START = '\n                    <li class="category-item">'
+SIDEBAR_LIST_END = '\n                </ul>'
+
+def normalize_changed_path(base_dir, path):
+    """
+    Converte o caminho recebido (absoluto ou relativo à pasta do catálogo)
+    em caminho relativo com '/'
+    """
+    if os.path.isabs(path):
+        path = os.path.relpath(path, base_dir)
+    return path.replace('\\', '/').strip('/')
+
+def carry_renamed(base_dir, manifest, renamed):
+    """
+    Copia no manifesto o estado das imagens renomeadas/movidas (renamed:
+    caminho antigo → novo, de arquivos ou pastas) para os caminhos novos.
+    Como o rename mantém tamanho e mtime, o scan reaproveita hash e dimensões
+    em vez de reler os arquivos.
+    """
+    for old, new in renamed.items():
+        old = normalize_changed_path(base_dir, old)
+        new = normalize_changed_path(base_dir, new)
+        prefix = old + '/'
+        for rel_path in [rel_path for rel_path in manifest['images']
+                         if rel_path == old or rel_path.startswith(prefix)]:
+            manifest['images'][new + rel_path[len(old):]] = manifest['images'][rel_path]
+
+def find_category_sections(html_content, category_name, start, end):
+    """
+    Localiza o bloco de seções de uma categoria entre start e end
+    """
+    marker = f' data-category="{category_name}"'
+    first = html_content.find(marker, start, end)
+    if first == -1:
+        return None
+    last = html_content.rfind(marker, start, end)
+
+    block_start = html_content.rfind(SECTION_START, start, first)
+    block_end = html_content.find('</section>', last, end)
+    if block_start == -1 or block_end == -1:
+        return None
+    return block_start, block_end + len('</section>')
+
+def find_sidebar_entry(html_content, category_name, start, end):
+    """
+    Localiza o <li> de uma categoria na sidebar entre start e end
+    """
+    anchor = html_content.find(f'<a href="#{quote(category_name)}" class="category-link"', start, end)
+    if anchor == -1:
+        return None
+
+    entry_start = html_content.rfind(SIDEBAR_ITEM_START, start, anchor)
+    # O bloco termina onde começa a próxima categoria (ou no fim da lista)
+    entry_end = html_content.find(SIDEBAR_ITEM_START, anchor, end)
+    if entry_end == -1:
+        entry_end = html_content.rfind(SIDEBAR_LIST_END, anchor, end)
+    if entry_start == -1 or entry_end == -1:
+        return None
+    return entry_start, entry_end
+
+def splice_category(html_content, category_name, new_block, order, bounds_fn, locate_fn):
+    """
+    Substitui, insere ou remove (new_block vazio) o bloco de uma categoria.
+    `order` é a lista ordenada das categorias presentes no HTML mais a categoria
+    alterada; uma categoria nova entra logo depois da anterior a ela.
+    Retorna None se não for possível localizar onde aplicar o patch.
+    """
+    bounds = bounds_fn(html_content)
+    if bounds is None:
+        return None
+    start, end = bounds
+
+    found = locate_fn(html_content, category_name, start, end)
+    if found:
+        return html_content[:found[0]] + new_block + html_content[found[1]:]
+    if not new_block:
+        return html_content
+
+    position = order.index(category_name)
+    for previous in reversed(order[:position]):
+        found = locate_fn(html_content, previous, start, end)
+        if found:
+            return html_content[:found[1]] + new_block + html_content[found[1]:]
+    for following in order[position + 1:]:
+        found = locate_fn(html_content, following, start, end)
+        if found:
+            return html_content[:found[0]] + new_block + html_content[found[0]:]
+    return None
+
+def patch_catalog(base_dir, changed_paths, old_manifest=None, html_content=None, renamed=None):
+    """
+    Atualiza no index.html existente apenas as seções e os links da sidebar
+    das categorias afetadas pelos caminhos alterados. Cai para o rebuild
+    completo se o manifesto ou a estrutura do HTML não estiverem disponíveis.
+
+    O manifesto e o HTML atuais podem ser passados já carregados (modo worker).
+    renamed (caminho antigo → novo) aproveita o estado das imagens movidas
+    (ver carry_renamed).
+    Retorna (manifesto novo, HTML gerado), ou (manifesto novo, None) quando o
+    HTML foi gravado pelo rebuild em streaming e não está em memória.
+    """
+    if old_manifest is None:
+        old_manifest = load_manifest(base_dir)
+    # Antes do carry_renamed, que deixa a imagem no caminho antigo e no novo
+    old_sources = duplicate_sources(old_manifest['images'])
+    carry_renamed(base_dir, old_manifest, renamed or {})
+
+    html_path = os.path.join(base_dir, 'index.html')
+    if html_content is None:
+        with phase('load'), open(html_path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+
+    rel_paths = [normalize_changed_path(base_dir, path) for path in changed_paths]
+    affected = sorted({rel_path.split('/')[0] for rel_path in rel_paths}, key=natural_sort_key)
+
+    # Forçar a releitura das pastas tocadas, mesmo que o mtime não tenha mudado
+    for rel_path in rel_paths:
+        old_manifest['dirs'].pop(os.path.dirname(rel_path), None)
+
+    if old_manifest['sharded']:
+        # No modo sharded o index.html é só a sidebar e o mapa de fragmentos:
+        # o rebuild incremental já regrava apenas o fragmento da categoria tocada
+        return build_catalog(base_dir, old_manifest=old_manifest)[0], None
+
+    if (not old_manifest['sections'] or
+            content_bounds(html_content) is None or
+            sidebar_bounds(html_content) is None):
+        print("⚠️  Manifesto ou estrutura do HTML indisponível, fazendo rebuild completo")
+        return build_catalog(base_dir, old_manifest=old_manifest)[0], None
+
+    manifest = empty_manifest()
+    for name in BUILD_OPTIONS:
+        manifest[name] = old_manifest[name]
+    for key in ('dirs', 'images', 'sections', 'search'):
+        manifest[key] = dict(old_manifest[key])
 
-# Se conseguimos extrair o template, gerar HTML completo
-if html_header and html_footer:
-    # Atualizar os links da sidebar no header
-    # Encontrar onde ficam os links da sidebar
-    nav_start = html_header.find('<nav class="sidebar-nav">')
-    if nav_start > -1:
-        nav_end = html_header.find('</nav>', nav_start)
-        if nav_end > -1:
-            # Encontrar onde começa o conteúdo da nav (depois da tag de abertura completa)
-            content_start = html_header.find('>', nav_start) + 1
-            # Substituir o conteúdo da nav, envolvendo em <ul class="category-list">
-            sidebar_content = '\n                <ul class="category-list" id="categoryList">\n' + ''.join(sidebar_links) + '\n                </ul>\n            '
-            new_header = html_header[:content_start] + sidebar_content + html_header[nav_end:]
-            html_header = new_header
-
-    # Montar HTML final
-    final_html = html_header + '\n' + ''.join(content_sections) + '\n        ' + html_footer
-
-    # Salvar o arquivo
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(final_html)
-
-    print(f"✅ Encontradas {len(categories)} categorias")
-    total_items = sum(len(items) for subcat in categories.values() for items in subcat.values())
-    print(f"✅ Total de {total_items} itens")
+    stats = dict.fromkeys(SCAN_COUNTERS, 0)
+    scanned = {}
+
+    def rescan(category_name):
+        # Descartar o estado antigo da categoria; o scan abaixo registra o atual
+        prefix = category_name + '/'
+        for key in ('dirs', 'images'):
+            for rel in [rel for rel in manifest[key] if rel == category_name or rel.startswith(prefix)]:
+                del manifest[key][rel]
+        scanned[category_name] = {}
+        if is_category_folder(base_dir, category_name):
+            with phase('scan'):
+                scanned[category_name] = scan_category(base_dir, category_name, old_manifest, manifest, stats)
+
+    for category_name in affected:
+        rescan(category_name)
+
+    # Cards de outras categorias que apontavam para uma cópia repetida que
+    # mudou (ou passam a apontar) também precisam ser renderizados de novo
+    sources = duplicate_sources(manifest['images'])
+    moved = {rel_path.split('/')[0] for rel_path in old_sources.keys() | sources.keys()
+             if old_sources.get(rel_path) != sources.get(rel_path)}
+    for category_name in sorted(moved - set(affected), key=natural_sort_key):
+        if category_name in manifest['sections']:
+            rescan(category_name)
+    affected = sorted(scanned, key=natural_sort_key)
+
+    thumbnails = {}
+    for category_name in affected:
+        subcats = scanned[category_name]
+        if subcats:
+            with phase('placeholders'):
+                attach_placeholders(base_dir, {category_name: subcats}, manifest)
+            with phase('versions'):
+                attach_sources({category_name: subcats}, manifest, sources)
+                thumbnails.update(attach_versions(base_dir, {category_name: subcats}, manifest))
+
+        order = sorted(set(manifest['sections']) | {category_name}, key=natural_sort_key)
+        with phase('render'):
+            if subcats:
+                section_html = render_category(category_name, subcats, compact=manifest['compact'])
+                sidebar_html = render_sidebar_entry(category_name, subcats)
+                manifest['sections'][category_name] = {'key': section_key(subcats), 'html': section_html}
+            else:
+                section_html = sidebar_html = ''
+                manifest['sections'].pop(category_name, None)
+
+            html_content = splice_category(html_content, category_name, section_html, order,
+                                           content_bounds, find_category_sections)
+            if html_content is not None:
+                html_content = splice_category(html_content, category_name, sidebar_html, order,
+                                               sidebar_bounds, find_sidebar_entry)
+        if html_content is None:
+            print(f"⚠️  Não foi possível localizar '{category_name}' no HTML, fazendo rebuild completo")
+            return build_catalog(base_dir, old_manifest=old_manifest)[0], None
+
+    count_scan_stats(stats)
+    count('categories_rendered', len(affected))
+    with phase('write_html'):
+        atomic_write(html_path, [html_content])
+    with phase('search'):
+        index_search(manifest, old_manifest['search'])
+        write_search_index(base_dir, manifest)
+        write_summary(base_dir, count_items(manifest['images']))
+    with phase('precompress'):
+        write_assets(base_dir, manifest, fast=True, thumbnails=thumbnails)
+
+    with phase('manifest'):
+        save_manifest(base_dir, manifest)
+    print(f"✅ Categorias atualizadas: {', '.join(affected)}")
     print("✅ Catálogo HTML atualizado com sucesso!")
-else:
-    # Apenas mostrar estatísticas
-    print(f"✅ Encontradas {len(categories)} categorias")
-    total_items = sum(len(items) for subcat in categories.values() for items in subcat.values())
-    print(f"✅ Total de {total_items} itens")
+    return manifest, html_content
+
+
+def scan(base_dir, old_manifest=None, jobs=1, options=None):
+    """
+    Lê as pastas do catálogo e devolve um Catalog. As pastas que não mudaram
+    desde old_manifest (por padrão, o manifesto salvo) são reaproveitadas dele.
+    options escolhe os modos de BUILD_OPTIONS do manifesto novo; os ausentes
+    ou None vêm de old_manifest.
+    """
+    if old_manifest is None:
+        old_manifest = load_manifest(base_dir)
+    manifest = empty_manifest()
+    for name in BUILD_OPTIONS:
+        value = (options or {}).get(name)
+        manifest[name] = old_manifest[name] if value is None else value
+
+    with phase('scan'):
+        categories, stats = scan_catalog(base_dir, old_manifest, manifest, jobs=jobs)
+    count_scan_stats(stats)
+    with phase('placeholders'):
+        attach_placeholders(base_dir, categories, manifest, prune=True)
+    with phase('versions'):
+        attach_sources(categories, manifest, duplicate_sources(manifest['images']))
+        thumbnails = attach_versions(base_dir, categories, manifest)
+    with phase('search'):
+        index_search(manifest, old_manifest['search'])
+    return Catalog(base_dir, categories, manifest, stats, thumbnails)
+
+def render(catalog, template, old_sections=None, stats=None):
+    """
+    Gerador com os pedaços do index.html: o texto do template (load_template)
+    com a sidebar e as seções (ou, no modo sharded, o mapa dos fragmentos, que
+    são gravados à medida que são gerados) nos slots. Seções de old_sections
+    cujos itens não mudaram são reaproveitadas; stats['rendered'] conta as
+    categorias renderizadas de novo.
+    """
+    if stats is None:
+        stats = {'rendered': 0}
+    if catalog.manifest['sharded']:
+        content = render_shards(catalog.base_dir, catalog.categories, old_sections or {},
+                                catalog.manifest, stats)
+    else:
+        content = render_content(catalog.categories, old_sections or {}, catalog.manifest, stats)
+
+    slots = {'sidebar': render_sidebar(catalog.categories), 'content': content}
+    for index, piece in enumerate(template):
+        # Posições pares: texto do template; ímpares: nome do slot
+        if index % 2:
+            yield from slots[piece]
+        else:
+            yield piece
+
+def write(catalog, chunks):
+    """
+    Grava o index.html a partir dos pedaços de render() (em streaming e de
+    forma atômica), o índice de busca, o resumo das contagens, as versões
+    comprimidas com as ETags e o manifesto
+    """
+    with phase('write_html'):
+        # O render corre intercalado com a gravação: write_html inclui a fase render
+        atomic_write(os.path.join(catalog.base_dir, 'index.html'), timed_chunks('render', chunks))
+        if not catalog.manifest['sharded']:
+            # Fragmentos de um build sharded anterior, que o index.html não usa mais
+            remove_shards(catalog.base_dir)
+    with phase('search'):
+        write_search_index(catalog.base_dir, catalog.manifest)
+        write_summary(catalog.base_dir, count_items(catalog.manifest['images']))
+    with phase('precompress'):
+        write_assets(catalog.base_dir, catalog.manifest, thumbnails=catalog.thumbnails)
+    with phase('manifest'):
+        save_manifest(catalog.base_dir, catalog.manifest)
+
+def build_catalog(base_dir, full=False, old_manifest=None, template=None, jobs=1, options=None):
+    """
+    Rebuild do catálogo inteiro (incremental, a não ser que full=True):
+    scan, render e write.
+
+    options pode trocar os modos de BUILD_OPTIONS; os que ficarem None mantêm
+    o valor usado no último build (guardado no manifesto).
+    O manifesto e o template já dividido nos slots podem ser passados
+    já carregados (modo worker). O HTML vai sendo gravado à medida que cada
+    categoria é gerada, sem montar a página inteira em memória.
+    Retorna (manifesto novo, True se o index.html foi gravado).
+    """
+    if old_manifest is None:
+        old_manifest = load_manifest(base_dir)
+    options = {name: old_manifest[name] if (options or {}).get(name) is None else options[name]
+               for name in BUILD_OPTIONS}
+    # Se o modo mudou, nenhuma seção guardada serve
+    same_mode = all(options[name] == old_manifest[name] for name in BUILD_OPTIONS)
+    if full:
+        old_manifest = empty_manifest()
+
+    catalog = scan(base_dir, old_manifest, jobs=jobs, options=options)
+    if template is None:
+        with phase('template'):
+            template = load_template(base_dir)
+
+    print(f"✅ Encontradas {len(catalog.categories)} categorias")
+    print(f"✅ Total de {len(catalog)} itens")
+    print(f"♻️  Pastas reaproveitadas do manifesto: {catalog.stats['reused']} (reescaneadas: {catalog.stats['scanned']})")
+
+    # Se conseguimos extrair o template, gerar HTML completo
+    if template is not None:
+        render_stats = {'rendered': 0}
+        old_sections = old_manifest['sections'] if same_mode else {}
+        write(catalog, render(catalog, template, old_sections, render_stats))
+        count('categories_rendered', render_stats['rendered'])
+        print(f"♻️  Categorias renderizadas de novo: {render_stats['rendered']} de {len(catalog.categories)}")
+        print("✅ Catálogo HTML atualizado com sucesso!")
+        return catalog.manifest, True
+
+    print("⚠️  Não foi possível identificar estrutura do HTML. Apenas contando itens.")
     print("⚠️  HTML não foi modificado (estrutura não identificada)")
+    return old_manifest, False
+
+
+# ---------------------------------------------------------------------------
+# Lock e fila de builds
+# ---------------------------------------------------------------------------
+
+@contextlib.contextmanager
+def catalog_lock(base_dir, blocking=False):
+    """
+    Lock exclusivo do catálogo (flock em .catalog.lock). Rende True se o lock
+    foi obtido, ou False se outro processo já está gerando e blocking=False.
+    Sem fcntl (Windows) não há lock.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield True
+        return
+
+    with open(os.path.join(base_dir, LOCK_NAME), 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def enqueue_request(base_dir, request):
+    """
+    Põe um pedido de build na fila: um arquivo por pedido, gravado de forma
+    atômica, para que quem esvazia a fila nunca leia um pedido pela metade
+    """
+    queue_path = os.path.join(base_dir, QUEUE_DIR)
+    os.makedirs(queue_path, exist_ok=True)
+    name = f"{time.time_ns()}-{os.getpid()}.json"
+    atomic_write(os.path.join(queue_path, name), [json.dumps(request, ensure_ascii=False)])
+
+def pending_requests(base_dir):
+    try:
+        with os.scandir(os.path.join(base_dir, QUEUE_DIR)) as entries:
+            return sorted(entry.name for entry in entries if entry.name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+
+def take_requests(base_dir):
+    """
+    Retira da fila os pedidos pendentes, na ordem de chegada
+    """
+    requests = []
+    for name in pending_requests(base_dir):
+        path = os.path.join(base_dir, QUEUE_DIR, name)
+        with open(path, 'r', encoding='utf-8') as f:
+            requests.append(json.load(f))
+        os.remove(path)
+    return requests
+
+def run_requests(base_dir, requests, jobs=1):
+    """
+    Executa de uma vez os pedidos acumulados. Se todos são patches, vira um
+    patch só com todos os caminhos; senão, um rebuild incremental (completo se
+    algum pediu --full) que também relê as pastas dos caminhos alterados.
+    O 'renamed' dos pedidos (caminho antigo → novo) aproveita o estado das
+    imagens movidas.
+    """
+    paths = [path for request in requests for path in request['paths']]
+    renamed = {}
+    for request in requests:
+        renamed.update(request.get('renamed', {}))
+    if all(request['patch'] for request in requests):
+        return patch_catalog(base_dir, paths, renamed=renamed)
+
+    options = {}
+    for request in requests:
+        for name, value in request['options'].items():
+            if value is not None:
+                options[name] = value
+
+    old_manifest = load_manifest(base_dir)
+    carry_renamed(base_dir, old_manifest, renamed)
+    for path in paths:
+        old_manifest['dirs'].pop(os.path.dirname(path), None)
+    return build_catalog(base_dir, full=any(request['full'] for request in requests),
+                         old_manifest=old_manifest, jobs=jobs, options=options)
+
+def run_coalesced(base_dir, request, jobs=1):
+    """
+    Executa um pedido de build sob o lock do catálogo. Todo pedido entra na
+    fila; quem tem o lock esvazia a fila em ciclos até ela ficar vazia. Se
+    outro processo já está gerando, este sai na hora e o pedido entra no
+    próximo ciclo do outro: N uploads seguidos custam no máximo dois builds.
+
+    Retorna True se este processo executou algum build.
+    """
+    enqueue_request(base_dir, request)
+    ran = False
+    while True:
+        with catalog_lock(base_dir) as acquired:
+            if not acquired:
+                if not ran:
+                    print("⏳ Outro build em andamento: o pedido vai no próximo ciclo dele")
+                return ran
+
+            requests = take_requests(base_dir)
+            while requests:
+                if ran:
+                    print(f"♻️  Catálogo alterado durante o build, gerando de novo ({len(requests)} pedido(s))")
+                run_requests(base_dir, requests, jobs=jobs)
+                ran = True
+                requests = take_requests(base_dir)
+
+        # Um pedido pode ter entrado na fila entre a última leitura e a liberação do lock
+        if not pending_requests(base_dir):
+            return ran
+
+
+# ---------------------------------------------------------------------------
+# Modo worker (--worker)
+# ---------------------------------------------------------------------------
+
+class CatalogWorker:
+    """
+    Estado mantido entre comandos no modo worker: manifesto, template já
+    dividido e o HTML atual, para não reler nem reprocessar nada do disco
+    a cada operação de admin.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.html_path = os.path.join(base_dir, 'index.html')
+        self.manifest_path = os.path.join(base_dir, MANIFEST_NAME)
+        self.manifest = None
+        self.manifest_mtime = None
+        self.html_content = None
+        self.html_mtime = None
+        self.template_path = os.path.join(base_dir, TEMPLATE_NAME)
+        self.template = None
+        self.template_mtime = None
+
+    def refresh(self):
+        """
+        Relê do disco apenas o que foi alterado por fora do worker
+        (ex.: o script executado manualmente)
+        """
+        html_mtime = mtime_ns(self.html_path)
+        if html_mtime != self.html_mtime:
+            with open(self.html_path, 'r', encoding='utf-8') as f:
+                self.html_content = f.read()
+            self.html_mtime = html_mtime
+
+        template_mtime = mtime_ns(self.template_path)
+        if template_mtime is None or template_mtime != self.template_mtime:
+            self.template = load_template(self.base_dir)
+            self.template_mtime = mtime_ns(self.template_path)
+
+        manifest_mtime = mtime_ns(self.manifest_path)
+        if manifest_mtime != self.manifest_mtime:
+            self.manifest = load_manifest(self.base_dir)
+            self.manifest_mtime = manifest_mtime
+
+    def handle(self, command):
+        if command.get('cmd') == 'ping':
+            return
+
+        # O worker espera o lock (o server.js aguarda a resposta) e, no fim,
+        # executa também os pedidos de linha de comando que chegaram na fila
+        while True:
+            with catalog_lock(self.base_dir, blocking=True):
+                if command is not None:
+                    self.refresh()
+                    self.run(command)
+                    command = None
+                requests = take_requests(self.base_dir)
+                while requests:
+                    run_requests(self.base_dir, requests)
+                    # O estado em disco mudou por fora do cache: reler no próximo comando
+                    self.manifest_mtime = self.html_mtime = None
+                    requests = take_requests(self.base_dir)
+            if not pending_requests(self.base_dir):
+                return
+
+    def run(self, command):
+        cmd = command.get('cmd')
+        if cmd == 'rebuild':
+            manifest, _ = build_catalog(self.base_dir, full=bool(command.get('full')),
+                                        old_manifest=self.manifest, template=self.template,
+                                        options={name: command.get(name) for name in BUILD_OPTIONS})
+            html_content = None
+        elif cmd == 'patch':
+            changed_paths = (list(command.get('add', [])) + list(command.get('remove', [])) +
+                             [path for pair in command.get('rename', []) for path in pair])
+            manifest, html_content = patch_catalog(self.base_dir, changed_paths,
+                                                   old_manifest=self.manifest, html_content=self.html_content,
+                                                   renamed=dict(command.get('rename', [])))
+        else:
+            raise ValueError(f"Comando desconhecido: {cmd!r}")
+
+        self.manifest = manifest
+        self.manifest_mtime = mtime_ns(self.manifest_path)
+        if html_content is not None:
+            self.html_content = html_content
+            self.html_mtime = mtime_ns(self.html_path)
+        else:
+            # O rebuild grava o HTML em streaming: relido do disco no próximo comando
+            self.html_content = None
+            self.html_mtime = None
+
+def run_worker(base_dir, timings=False, profile_path=None):
+    """
+    Lê comandos JSON do stdin (um por linha) e responde uma linha JSON por
+    comando no stdout. Comandos:
+
+        {"cmd": "rebuild", "full": false, "compact": null, "sharded": null}
+        {"cmd": "patch", "add": [...], "remove": [...], "rename": [[antigo, novo], ...]}
+        {"cmd": "ping"}
+        {"cmd": "shutdown"}
+
+    Resposta: {"ok": true/false, "output": "...", "elapsed_ms": 1.23, "error": "..."}
+    Com timings=True a resposta leva também "timings" (ver instrumented); com
+    profile_path, o dump do cProfile do último comando é gravado nesse arquivo.
+    """
+    worker = CatalogWorker(base_dir)
+    protocol = sys.stdout
+
+    def respond(response):
+        protocol.write(json.dumps(response, ensure_ascii=False) + '\n')
+        protocol.flush()
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            command = json.loads(line)
+        except ValueError as e:
+            respond({'ok': False, 'error': f"JSON inválido: {e}"})
+            continue
+        if not isinstance(command, dict):
+            respond({'ok': False, 'error': f"Comando deve ser um objeto JSON: {line}"})
+            continue
+
+        if command.get('cmd') == 'shutdown':
+            respond({'ok': True})
+            break
+
+        started = time.perf_counter()
+        output = io.StringIO()
+        response = {'ok': True}
+        try:
+            # O stdout é o canal do protocolo: as mensagens do build vão na resposta
+            with contextlib.redirect_stdout(output), instrumented(timings, profile_path) as measured:
+                worker.handle(command)
+        except Exception as e:
+            response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        response['output'] = output.getvalue()
+        response['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        if timings:
+            response['timings'] = measured
+        respond(response)
+
+
+# ---------------------------------------------------------------------------
+# Modo watch (--watch)
+# ---------------------------------------------------------------------------
+
+def is_watched_path(rel_path, is_dir):
+    """
+    Caminhos que interessam ao catálogo: pastas de categoria e subpastas, e
+    imagens dentro delas (ficam de fora arquivos ocultos e temporários,
+    .thumbnails, node_modules e os arquivos gerados na raiz)
+    """
+    parts = rel_path.split('/')
+    if is_ignored_entry(parts[0]) or any(part.startswith('.') or part == 'node_modules' for part in parts):
+        return False
+    if is_dir:
+        return True
+    return len(parts) > 1 and os.path.splitext(rel_path.lower())[1] in IMAGE_EXTENSIONS
+
+def watch_request(paths=(), renamed=None):
+    """Pedido de build da fila: patch dos caminhos, ou incremental de tudo se paths estiver vazio"""
+    return {'paths': sorted(paths), 'renamed': renamed or {}, 'full': False,
+            'options': dict.fromkeys(BUILD_OPTIONS), 'patch': bool(paths)}
+
+def run_watch(base_dir, jobs=1, poll_interval=None):
+    """
+    Observa as pastas do catálogo (catalog_watch) e, a cada lote de mudanças
+    (imagens copiadas para as pastas, git pull...), tira os acentos dos nomes
+    novos com as regras do rename_files.py (levando os thumbnails junto) e
+    atualiza só as categorias tocadas. Sem mudanças, o processo fica parado
+    esperando o kernel (inotify) ou faz um stat por pasta a cada poll_interval.
+    """
+    from catalog_watch import RESCAN, InotifyWatcher, batches, open_watcher
+    from rename_files import apply_plan, catalog_renames, plan_renames
+
+    watcher = open_watcher(base_dir, is_watched_path, poll_interval)
+    mode = 'inotify' if isinstance(watcher, InotifyWatcher) else f"polling a cada {watcher.interval:g} s"
+    print(f"👀 Observando as pastas do catálogo ({mode}). Ctrl+C para sair")
+
+    # O que mudou enquanto ninguém estava observando
+    run_coalesced(base_dir, watch_request(), jobs=jobs)
+    try:
+        for changed in batches(watcher):
+            try:
+                if RESCAN in changed:
+                    print("⚠️  Eventos perdidos, conferindo o catálogo inteiro")
+                    run_coalesced(base_dir, watch_request(), jobs=jobs)
+                    continue
+
+                existing = [rel_path for rel_path in changed if os.path.lexists(os.path.join(base_dir, rel_path))]
+                plan = plan_renames(base_dir, existing)
+                applied = apply_plan(base_dir, plan) if plan['renames'] else []
+                # As renomeações feitas aqui também geram eventos: não processar de novo
+                watcher.ignore({path.replace(os.sep, '/') for change in applied
+                                for path in (change['old'], change['new'])})
+
+                renamed = catalog_renames(applied)
+                paths = changed | set(renamed.values())
+                categories = sorted({path.split('/')[0] for path in paths}, key=natural_sort_key)
+                print(f"🔄 {len(changed)} mudança(s) em: {', '.join(categories)}")
+                run_coalesced(base_dir, watch_request(paths, renamed), jobs=jobs)
+            except Exception as e:
+                print(f"❌ Erro ao atualizar o catálogo: {type(e).__name__}: {e}")
+    except KeyboardInterrupt:
+        print("\n⏹️  Observação encerrada")
+    finally:
+        watcher.close()
+
+
+def run_thumbnail_stage(base_dir, jobs=None, force=False):
+    """
+    Etapa --thumbnails: gera thumbnail e variantes das imagens que não têm.
+    O build seguinte reescaneia as pastas de .thumbnails alteradas e passa a
+    usar os arquivos novos. Roda sob o lock do catálogo, como os builds, para
+    não gravar em .thumbnails enquanto outro processo gera ou renomeia.
+    """
+    from catalog_images import backfill_thumbnails
+
+    with catalog_lock(base_dir, blocking=True):
+        manifest = empty_manifest()
+        scan_catalog(base_dir, load_manifest(base_dir), manifest)
+        with phase('thumbnails'):
+            return backfill_thumbnails(base_dir, sorted(manifest['images']), jobs=jobs, force=force)
+
+
+# ---------------------------------------------------------------------------
+# Exportação (--export)
+# ---------------------------------------------------------------------------
+
+def export_records(base_dir, old_manifest=None, counts=None):
+    """
+    Gerador com um registro (dict com EXPORT_FIELDS) por item, em ordem,
+    entregue categoria a categoria à medida que o scan avança: não monta a
+    árvore de Items, e só o estado da categoria atual fica em memória.
+    Pastas e imagens que não mudaram vêm do manifesto salvo, sem reler nada;
+    o manifesto não é alterado. As imagens novas não são hasheadas. counts, se dado, recebe as contagens
+    (ver count_items).
+    """
+    if old_manifest is None:
+        old_manifest = load_manifest(base_dir)
+    for category_name in list_categories(base_dir):
+        manifest = empty_manifest()
+        stats = dict.fromkeys(SCAN_COUNTERS, 0)
+        with phase('scan'):
+            folders = scan_folder(base_dir, category_name, old_manifest, manifest, stats, hash=False)
+        count_scan_stats(stats)
+        for rel_dir, files in folders:
+            if counts is not None:
+                count_items((f"{rel_dir}/{name}" for name in files), counts)
+            for name in files:
+                rel_path = f"{rel_dir}/{name}"
+                image = manifest['images'][rel_path]
+                category, subcategory, _ = split_path(rel_path)
+                yield {
+                    'category': category,
+                    'subcategory': subcategory,
+                    'name': os.path.splitext(name)[0],
+                    'path': rel_path,
+                    'thumbnail': f".thumbnails/{rel_path}" if image['thumbnail'] else None,
+                    'size': image['size'],
+                    'width': image['width'],
+                    'height': image['height'],
+                }
+
+def export_chunks(records, fmt):
+    """
+    Texto do export em pedaços: uma linha JSON por item (jsonl) ou CSV com
+    cabeçalho (campos vazios para thumbnail e dimensões ausentes)
+    """
+    if fmt == 'jsonl':
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        return
+
+    import csv
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS, lineterminator='\n')
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def run_export(base_dir, path, fmt=None):
+    """
+    Grava o export em path ('-' para a saída padrão), no formato fmt ('jsonl'
+    ou 'csv'; por padrão, pela extensão do arquivo), e atualiza o resumo das
+    contagens com o que foi exportado
+    """
+    if fmt is None:
+        fmt = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    counts = {}
+    chunks = export_chunks(export_records(base_dir, counts=counts), fmt)
+    # O scan corre intercalado com a gravação: export inclui a fase scan
+    with phase('export'):
+        if path == '-':
+            try:
+                for chunk in chunks:
+                    sys.stdout.write(chunk)
+                sys.stdout.flush()
+            except BrokenPipeError:
+                # Quem lia parou antes do fim (ex.: | head): sair sem traceback e sem
+                # gravar o resumo de um export incompleto. A saída padrão passa a ser
+                # o devnull para que o flush na saída do Python não falhe de novo
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                sys.exit(1)
+        else:
+            atomic_write(path, chunks)
+    with catalog_lock(base_dir, blocking=True):
+        write_summary(base_dir, counts)
+    total = sum(sum(subcats.values()) for subcats in counts.values())
+    # Com '-' a saída padrão é o próprio export: as mensagens vão para o stderr
+    print(f"✅ {total} itens de {len(counts)} categorias exportados ({fmt})",
+          file=sys.stderr if path == '-' else sys.stdout)
+    return counts
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Gera o catálogo HTML a partir das pastas de imagens')
+    parser.add_argument('--full', action='store_true',
+                        help='ignora o manifesto e refaz o scan e a renderização de tudo')
+    parser.add_argument('--add', action='append', default=[], metavar='CAMINHO',
+                        help='imagem adicionada: atualiza só a categoria dela')
+    parser.add_argument('--remove', action='append', default=[], metavar='CAMINHO',
+                        help='imagem removida: atualiza só a categoria dela')
+    parser.add_argument('--rename', action='append', nargs=2, default=[], metavar=('ANTIGO', 'NOVO'),
+                        help='imagem renomeada/movida: atualiza as categorias de origem e destino')
+    parser.add_argument('--compact', action=argparse.BooleanOptionalAction, default=None,
+                        help='não duplica os cards nas seções de subcategoria (montadas no navegador); '
+                             'o modo fica guardado no manifesto para os próximos builds')
+    parser.add_argument('--sharded', action=argparse.BooleanOptionalAction, default=None,
+                        help='index.html só com a sidebar; cada categoria vai para catalog/<categoria>.<hash>.html '
+                             'e é baixada sob demanda (guardado no manifesto)')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='lê as pastas de categoria em paralelo com N threads (árvores grandes)')
+    parser.add_argument('--thumbnails', action='store_true',
+                        help='antes do build, gera (com Pillow, em paralelo) os thumbnails que faltam '
+                             'e as variantes WebP usadas no srcset')
+    parser.add_argument('--worker', action='store_true',
+                        help='processo persistente: lê comandos JSON do stdin (um por linha)')
+    parser.add_argument('--watch', action='store_true',
+                        help='fica observando as pastas: tira os acentos dos nomes novos e atualiza só as '
+                             'categorias alteradas (inotify no Linux, senão polling)')
+    parser.add_argument('--poll', type=float, metavar='SEGUNDOS',
+                        help='no --watch, usa polling com esse intervalo em vez do inotify')
+    parser.add_argument('--timings', action='store_true',
+                        help='no fim, imprime uma linha JSON com o tempo (relógio e CPU) de cada fase, '
+                             'contadores do scan e bytes gravados; no --worker, vai em cada resposta')
+    parser.add_argument('--profile', metavar='ARQUIVO',
+                        help='grava um dump do cProfile do build (python3 -m pstats ARQUIVO)')
+    parser.add_argument('--export', metavar='ARQUIVO',
+                        help='em vez do build, grava um registro por item (categoria, subcategoria, nome, '
+                             'caminho, thumbnail, tamanho, dimensões) em ARQUIVO (- para a saída padrão)')
+    parser.add_argument('--format', choices=('jsonl', 'csv'),
+                        help='formato do --export (padrão: csv se o arquivo terminar em .csv, senão jsonl)')
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    if args.worker:
+        run_worker(base_dir, timings=args.timings, profile_path=args.profile)
+        return
+
+    if args.watch:
+        run_watch(base_dir, jobs=args.jobs, poll_interval=args.poll)
+        return
+
+    if args.export:
+        with instrumented(args.timings, args.profile) as measured:
+            run_export(base_dir, args.export, args.format)
+        if args.timings:
+            print(json.dumps(measured, ensure_ascii=False), file=sys.stderr if args.export == '-' else sys.stdout)
+        return
+
+    with instrumented(args.timings, args.profile) as measured:
+        if args.thumbnails:
+            run_thumbnail_stage(base_dir, jobs=args.jobs if args.jobs > 1 else None)
+
+        changed_paths = args.add + args.remove + [path for pair in args.rename for path in pair]
+        options = {'compact': args.compact, 'sharded': args.sharded}
+        run_coalesced(base_dir, {
+            'paths': [normalize_changed_path(base_dir, path) for path in changed_paths],
+            'renamed': dict(args.rename),
+            'full': args.full,
+            'options': options,
+            'patch': bool(changed_paths) and not args.full and all(value is None for value in options.values()),
+        }, jobs=args.jobs)
+
+    if args.timings:
+        print(json.dumps(measured, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
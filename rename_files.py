@@ -4,113 +4,319 @@ Script para renomear arquivos e pastas removendo caracteres especiais
 Converte: ç→c, ã→a, õ→o, ê→e, etc.
 """
 import os
-import re
-import shutil
+import sys
+import json
 import unicodedata
-from pathlib import Path
+
+from catalog_images import (THUMBNAILS_DIR, VARIANT_WIDTHS, load_thumbnail_index, save_thumbnail_index,
+                            variant_name)
+
+# Letras latinas sem decomposição Unicode (não são letra base + acento)
+LATIN_LETTERS = {
+    'Æ': 'AE', 'æ': 'ae', 'Œ': 'OE', 'œ': 'oe', 'ß': 'ss', 'ẞ': 'SS',
+    'Ø': 'O', 'ø': 'o', 'Ð': 'D', 'ð': 'd', 'Đ': 'D', 'đ': 'd',
+    'Þ': 'TH', 'þ': 'th', 'Ł': 'L', 'ł': 'l', 'Ħ': 'H', 'ħ': 'h',
+    'Ŧ': 'T', 'ŧ': 't', 'ı': 'i', '·': '',
+}
+
+# Latin-1, Latin Extended-A/B e Latin Extended Additional
+LATIN_RANGES = (range(0xC0, 0x250), range(0x1E00, 0x1F00))
+
+def build_accent_table():
+    """
+    Tabela para str.translate: cada letra latina acentuada (decomposição NFKD
+    sem as marcas combinantes) vira a versão ASCII, e acentos soltos
+    (marcas combinantes, ex.: nomes em NFD) são removidos
+    """
+    table = {code: None for code in range(0x300, 0x370)}
+    for letters in LATIN_RANGES:
+        for code in letters:
+            char = chr(code)
+            plain = ''.join(LATIN_LETTERS.get(part, part)
+                            for part in unicodedata.normalize('NFKD', LATIN_LETTERS.get(char, char))
+                            if not unicodedata.combining(part))
+            if plain != char and plain and plain.isascii():
+                table[code] = plain
+    return table
+
+ACCENT_TABLE = build_accent_table()
 
 def remove_accents(text):
     """Remove acentos e caracteres especiais de uma string"""
-    # Normalizar Unicode para NFC primeiro
-    text = unicodedata.normalize('NFC', text)
-
-    # Mapeamento de caracteres especiais para versões sem acento
-    replacements = {
-        'á': 'a', 'à': 'a', 'ã': 'a', 'â': 'a', 'ä': 'a',
-        'é': 'e', 'è': 'e', 'ê': 'e', 'ë': 'e',
-        'í': 'i', 'ì': 'i', 'î': 'i', 'ï': 'i',
-        'ó': 'o', 'ò': 'o', 'õ': 'o', 'ô': 'o', 'ö': 'o',
-        'ú': 'u', 'ù': 'u', 'û': 'u', 'ü': 'u',
-        'ç': 'c',
-        'ñ': 'n',
-        'Á': 'A', 'À': 'A', 'Ã': 'A', 'Â': 'A', 'Ä': 'A',
-        'É': 'E', 'È': 'E', 'Ê': 'E', 'Ë': 'E',
-        'Í': 'I', 'Ì': 'I', 'Î': 'I', 'Ï': 'I',
-        'Ó': 'O', 'Ò': 'O', 'Õ': 'O', 'Ô': 'O', 'Ö': 'O',
-        'Ú': 'U', 'Ù': 'U', 'Û': 'U', 'Ü': 'U',
-        'Ç': 'C',
-        'Ñ': 'N',
-    }
-
-    result = text
-    for old, new in replacements.items():
-        result = result.replace(old, new)
+    # Normalizar Unicode para NFC primeiro e trocar tudo numa passada só
+    result = unicodedata.normalize('NFC', text).translate(ACCENT_TABLE)
 
     # Remover espaços no final
     result = result.rstrip()
 
     return result
 
-def rename_in_directory(base_path, dry_run=False):
-    """Renomeia arquivos e pastas em um diretório"""
-    base_path = Path(base_path)
-    changes = []
-
-    # Pastas a ignorar
-    ignore_dirs = {'.git', 'node_modules', 'thumbmails'}
-
-    # Primeiro, coletar todas as mudanças necessárias
-    # Começar dos níveis mais profundos para evitar problemas
-    all_paths = []
-    for root, dirs, files in os.walk(base_path, topdown=False):
-        # Remover pastas ignoradas
-        dirs[:] = [d for d in dirs if d not in ignore_dirs]
-
-        root_path = Path(root)
-
-        # Adicionar arquivos
-        for file in files:
-            file_path = root_path / file
-            all_paths.append((file_path, False))  # False = é arquivo
-
-        # Adicionar diretórios
-        for dir_name in dirs:
-            dir_path = root_path / dir_name
-            all_paths.append((dir_path, True))  # True = é diretório
-
-    # Processar mudanças
-    for path, is_dir in all_paths:
-        old_name = unicodedata.normalize('NFC', path.name)
-        new_name = remove_accents(old_name)
-
-        # Debug: mostrar o que está sendo processado
-        if dry_run and ('ç' in old_name.lower() or 'ã' in old_name.lower() or 'õ' in old_name.lower()):
-            print(f"DEBUG: Processando '{old_name}' → '{new_name}' (igual: {old_name == new_name})")
-
-        if old_name != new_name:
-            new_path = path.parent / new_name
-
-            type_str = "DIR " if is_dir else "FILE"
-            rel_old = path.relative_to(base_path)
-            rel_new = new_path.relative_to(base_path)
-
-            changes.append({
-                'old': path,
-                'new': new_path,
-                'rel_old': str(rel_old),
-                'rel_new': str(rel_new),
-                'is_dir': is_dir
-            })
-
-            print(f"[{type_str}] {rel_old} → {rel_new}")
-
-            if not dry_run:
-                try:
+
+# Pastas a ignorar
+IGNORED_DIRS = {'.git', 'node_modules', 'thumbmails'}
+
+PLAN_VERSION = 2
+
+def plan_renames(base_path, paths=None):
+    """
+    Percorre a árvore uma vez e monta o plano de renomeação:
+
+        {"version": 2,
+         "renames": [{"old": "Calças/Lençol.jpg", "new": "Calças/Lencol.jpg", "is_dir": false,
+                      "thumbnails": [[".thumbnails/Calças/Lençol.jpg", ".thumbnails/Calças/Lencol.jpg"], ...]},
+                     ...],
+         "conflicts": [{"old": ..., "new": ..., "is_dir": ..., "thumbnails": [...], "reason": "..."}]}
+
+    Os caminhos são relativos a base_path, e as renomeações vêm na ordem de
+    execução: o conteúdo de cada pasta antes da própria pasta, então cada
+    caminho antigo continua válido no momento em que é renomeado.
+
+    A pasta .thumbnails não é percorrida: o thumbnail e as variantes de cada
+    imagem (e a pasta correspondente de cada pasta) vão junto com o original,
+    na lista "thumbnails" da mesma renomeação.
+
+    Uma renomeação cujo nome novo já existe na pasta ou coincide com o de
+    outra (ex.: "Calça.jpg" e "Calca.jpg", ou "Lençol" e "Lencol") vai para
+    conflicts e não é executada. Os nomes são comparados sem diferenciar
+    maiúsculas, como nos sistemas de arquivos do macOS e do Windows.
+
+    Com paths (caminhos relativos), só esses arquivos e pastas (com tudo o
+    que houver dentro das pastas) entram no plano, sem percorrer o resto.
+    """
+    plan = {'version': PLAN_VERSION, 'renames': [], 'conflicts': []}
+
+    def list_names(path):
+        try:
+            with os.scandir(path) as entries:
+                return [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in entries]
+        except OSError:
+            return []
+
+    def walk(rel_dir, only=None):
+        children = [(name, is_dir) for name, is_dir in list_names(os.path.join(base_path, rel_dir))
+                    if name not in IGNORED_DIRS and (rel_dir or name != THUMBNAILS_DIR)]
+        # Um único scandir da pasta de thumbnails correspondente
+        thumbnails = {name for name, _ in list_names(os.path.join(base_path, THUMBNAILS_DIR, rel_dir))}
+        thumbnail_keys = {name.casefold() for name in thumbnails}
+
+        # Começar dos níveis mais profundos para evitar problemas
+        for name, is_dir in children:
+            if is_dir and (only is None or name in only):
+                walk(os.path.join(rel_dir, name))
+
+        targets = {}
+        for name, is_dir in children:
+            targets.setdefault(remove_accents(name).casefold(), []).append(name)
+
+        for name, is_dir in children:
+            new_name = remove_accents(name)
+            if new_name == name or (only is not None and name not in only):
+                continue
+            change = {'old': os.path.join(rel_dir, name), 'new': os.path.join(rel_dir, new_name),
+                      'is_dir': is_dir, 'thumbnails': []}
+
+            # Thumbnail e variantes (ou a pasta, no caso de pastas) com o mesmo nome em .thumbnails
+            pairs = [(name, new_name)]
+            if not is_dir:
+                pairs += [(variant_name(name, width), variant_name(new_name, width)) for width in VARIANT_WIDTHS]
+            blocked = []
+            for old_thumbnail, new_thumbnail in pairs:
+                if old_thumbnail in thumbnails:
+                    change['thumbnails'].append([os.path.join(THUMBNAILS_DIR, rel_dir, old_thumbnail),
+                                                 os.path.join(THUMBNAILS_DIR, rel_dir, new_thumbnail)])
+                    if new_thumbnail.casefold() in thumbnail_keys:
+                        blocked.append(new_thumbnail)
+
+            if not new_name:
+                change['reason'] = 'o nome ficaria vazio'
+            elif len(targets[new_name.casefold()]) > 1:
+                others = [other for other in targets[new_name.casefold()] if other != name]
+                change['reason'] = f"mesmo nome que {', '.join(others)}"
+            elif blocked:
+                change['reason'] = f"{os.path.join(THUMBNAILS_DIR, rel_dir, blocked[0])} já existe"
+            plan['conflicts' if 'reason' in change else 'renames'].append(change)
+
+    if paths is None:
+        walk('')
+        return plan
+
+    # Caminhos dentro de outro da lista já são cobertos por ele
+    paths = {os.path.normpath(path) for path in paths}
+    by_dir = {}
+    for path in paths:
+        parts = path.split(os.sep)
+        if any(os.sep.join(parts[:i]) in paths for i in range(1, len(parts))):
+            continue
+        rel_dir, name = os.path.split(path)
+        by_dir.setdefault(rel_dir, set()).add(name)
+    # Pastas mais fundas primeiro, para manter o conteúdo antes da pasta
+    for rel_dir in sorted(by_dir, key=lambda rel_dir: -len(rel_dir.split(os.sep)) if rel_dir else 0):
+        walk(rel_dir, only=by_dir[rel_dir])
+    return plan
+
+def apply_plan(base_path, plan):
+    """
+    Executa as renomeações de um plano (plan_renames ou load_plan), sem
+    percorrer a árvore de novo. Cada renomeação move o original e os
+    thumbnails dele juntos: se um dos passos falha, os já feitos são
+    desfeitos. Uma renomeação cujo arquivo de origem sumiu ou cujo destino
+    passou a existir depois do plano é pulada. O .thumbnails/.index.json é
+    atualizado em seguida (update_thumbnail_index).
+
+    Roda sob o lock do catálogo: um build ou o generate_catalog.py --thumbnails
+    em outro processo não lê nem grava arquivos que estão sendo movidos.
+    Retorna a lista das renomeações feitas.
+    """
+    import generate_catalog as gc
+
+    with gc.catalog_lock(base_path, blocking=True):
+        applied = []
+        for change in plan['renames']:
+            type_str = "DIR " if change['is_dir'] else "FILE"
+            print(f"[{type_str}] {change['old']} → {change['new']}")
+
+            moves = [(change['old'], change['new'])] + [tuple(pair) for pair in change.get('thumbnails', [])]
+            done = []
+            try:
+                for old, new in moves:
+                    old_path = os.path.join(base_path, old)
+                    new_path = os.path.join(base_path, new)
+                    if not os.path.lexists(old_path):
+                        raise FileNotFoundError(f"{old} não existe mais")
+                    if os.path.lexists(new_path):
+                        raise FileExistsError(f"{new} já existe")
                     # Renomear
-                    path.rename(new_path)
-                    print(f"  ✅ Renomeado com sucesso")
-                except Exception as e:
-                    print(f"  ❌ Erro: {e}")
+                    os.rename(old_path, new_path)
+                    done.append((old_path, new_path))
+            except Exception as e:
+                for old_path, new_path in reversed(done):
+                    try:
+                        os.rename(new_path, old_path)
+                    except OSError as undo_error:
+                        print(f"  ❌ Não foi possível desfazer {new_path}: {undo_error}")
+                print(f"  ❌ Erro: {e}")
+                continue
 
-    return changes
+            applied.append(change)
+            thumbnails = len(change.get('thumbnails', []))
+            print(f"  ✅ Renomeado com sucesso" + (f" (+{thumbnails} em {THUMBNAILS_DIR})" if thumbnails else ''))
+        update_thumbnail_index(base_path, applied)
+    return applied
 
-if __name__ == '__main__':
-    import sys
+def final_path(renames, rel_path):
+    """
+    Caminho que rel_path (relativo à árvore de antes das renomeações) passou
+    a ter: renames é {caminho antigo: caminho novo} das renomeações feitas,
+    em que cada pasta foi renomeada depois do seu conteúdo
+    """
+    parts = rel_path.split(os.sep)
+    result = list(parts)
+    for i in range(len(parts)):
+        new = renames.get(os.sep.join(parts[:i + 1]))
+        if new is not None:
+            result[i] = os.path.basename(new)
+    return os.sep.join(result)
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
+def update_thumbnail_index(base_path, applied):
+    """
+    Troca no .thumbnails/.index.json os caminhos renomeados, para que o
+    generate_catalog.py --thumbnails não gere de novo os thumbnails movidos
+    """
+    index = load_thumbnail_index(base_path)
+    if not index:
+        return
+    renames = {change['old']: change['new'] for change in applied}
+    save_thumbnail_index(base_path, {final_path(renames, rel_path.replace('/', os.sep)).replace(os.sep, '/'): entry
+                                     for rel_path, entry in index.items()})
+
+def catalog_renames(applied):
+    """
+    Mapa caminho antigo → novo (relativos, com '/') das pastas e imagens
+    renomeadas que fazem parte do catálogo, já com as pastas de cima renomeadas
+    """
+    from generate_catalog import IMAGE_EXTENSIONS
+
+    renames = {change['old']: change['new'] for change in applied}
+    renamed = {}
+    for change in applied:
+        # Só pastas e imagens dentro das categorias entram no catálogo
+        if os.sep in change['old'] or change['is_dir']:
+            if change['is_dir'] or os.path.splitext(change['old'].lower())[1] in IMAGE_EXTENSIONS:
+                renamed[change['old'].replace(os.sep, '/')] = final_path(renames, change['old']).replace(os.sep, '/')
+    return renamed
+
+def update_catalog(base_path, applied):
+    """
+    Passa ao generate_catalog o mapa caminho antigo → novo das pastas e
+    imagens renomeadas: só as categorias afetadas são renderizadas de novo,
+    e o estado das imagens (hash, dimensões) vem do manifesto.
+    Retorna True se o catálogo foi atualizado.
+    """
+    import generate_catalog as gc
+
+    if not os.path.exists(os.path.join(base_path, 'index.html')):
+        return False
+
+    renamed = catalog_renames(applied)
+    if not renamed:
+        return False
+
+    gc.run_coalesced(base_path, {
+        'paths': sorted(set(renamed) | set(renamed.values())),
+        'renamed': renamed,
+        'full': False,
+        'options': dict.fromkeys(gc.BUILD_OPTIONS),
+        'patch': True,
+    })
+    return True
+
+def save_plan(path, plan):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+def load_plan(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f"Versão de plano não suportada: {plan.get('version')!r}")
+    return plan
+
+def print_plan(plan):
+    for change in plan['renames']:
+        type_str = "DIR " if change['is_dir'] else "FILE"
+        thumbnails = len(change.get('thumbnails', []))
+        print(f"[{type_str}] {change['old']} → {change['new']}" +
+              (f" (+{thumbnails} em {THUMBNAILS_DIR})" if thumbnails else ''))
+    for change in plan['conflicts']:
+        type_str = "DIR " if change['is_dir'] else "FILE"
+        print(f"⚠️  [{type_str}] {change['old']} → {change['new']}: {change['reason']} (não será renomeado)")
+
+def rename_in_directory(base_path, dry_run=False):
+    """
+    Renomeia arquivos e pastas em um diretório (plan_renames + apply_plan).
+    Com dry_run=True só mostra o plano. Retorna as renomeações planejadas
+    (dry_run) ou feitas.
+    """
+    plan = plan_renames(base_path)
+    if dry_run:
+        print_plan(plan)
+        return plan['renames']
+    return apply_plan(base_path, plan)
+
+def main():
+    import argparse
 
-    # Verificar se foi passado argumento --yes ou -y
-    auto_confirm = len(sys.argv) > 1 and sys.argv[1] in ['--yes', '-y']
+    parser = argparse.ArgumentParser(description='Renomeia arquivos e pastas removendo acentos')
+    parser.add_argument('-y', '--yes', action='store_true', help='executa sem pedir confirmação')
+    parser.add_argument('--plan', metavar='ARQUIVO',
+                        help='só grava o plano (JSON) neste arquivo, para revisar e executar depois com --apply')
+    parser.add_argument('--apply', metavar='ARQUIVO', help='executa um plano gravado com --plan')
+    parser.add_argument('--no-catalog', action='store_true',
+                        help='não atualiza o index.html depois de renomear')
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
 
     print("=" * 80)
     print("SCRIPT DE RENOMEAÇÃO DE ARQUIVOS")
@@ -118,21 +324,34 @@ if __name__ == '__main__':
     print(f"Diretório base: {base_dir}")
     print()
 
-    # Primeiro fazer um dry-run para mostrar o que será mudado
-    print("🔍 SIMULAÇÃO (DRY RUN) - Nenhuma alteração será feita ainda:")
+    if args.apply:
+        plan = load_plan(args.apply)
+        print(f"📄 PLANO LIDO DE {args.apply}:")
+    else:
+        # Primeiro montar o plano (dry run) para mostrar o que será mudado
+        print("🔍 SIMULAÇÃO (DRY RUN) - Nenhuma alteração será feita ainda:")
+        plan = plan_renames(base_dir)
     print("-" * 80)
-    changes = rename_in_directory(base_dir, dry_run=True)
+    print_plan(plan)
 
-    if not changes:
+    if args.plan:
+        save_plan(args.plan, plan)
+        print()
+        print(f"✅ Plano gravado em {args.plan} ({len(plan['renames'])} mudanças)")
+        sys.exit(0)
+
+    if not plan['renames']:
         print("✅ Nenhum arquivo ou pasta precisa ser renomeado!")
         sys.exit(0)
 
     print()
-    print(f"📊 Total de mudanças: {len(changes)}")
+    print(f"📊 Total de mudanças: {len(plan['renames'])}")
+    if plan['conflicts']:
+        print(f"⚠️  Conflitos (ficam com o nome atual): {len(plan['conflicts'])}")
     print()
 
     # Confirmar com o usuário
-    if auto_confirm:
+    if args.yes:
         response = 's'
         print("⚡ Auto-confirmado via argumento --yes")
     else:
@@ -142,15 +361,32 @@ if __name__ == '__main__':
         print()
         print("🔄 EXECUTANDO MUDANÇAS:")
         print("-" * 80)
-        changes = rename_in_directory(base_dir, dry_run=False)
+        # Executa o mesmo plano mostrado acima, sem percorrer a árvore de novo
+        changes = apply_plan(base_dir, plan)
 
         print()
         print(f"✅ Concluído! {len(changes)} arquivos/pastas renomeados.")
+
+        # Os thumbnails foram junto: basta atualizar as categorias afetadas
+        if changes and not args.no_catalog:
+            print()
+            print("🔄 ATUALIZANDO O CATÁLOGO:")
+            print("-" * 80)
+            catalog_updated = update_catalog(base_dir, changes)
+        else:
+            catalog_updated = False
+
         print()
         print("⚠️  PRÓXIMOS PASSOS:")
-        print("1. Execute: python3 generate_catalog.py")
-        print("2. Faça commit: git add . && git commit -m 'Renomeia arquivos removendo acentos'")
-        print("3. Faça push: git push")
+        steps = [] if catalog_updated else ["Execute: python3 generate_catalog.py"]
+        steps += ["Faça commit: git add . && git commit -m 'Renomeia arquivos removendo acentos'",
+                  "Faça push: git push"]
+        for number, step in enumerate(steps, 1):
+            print(f"{number}. {step}")
     else:
         print()
         print("❌ Operação cancelada pelo usuário.")
+
+
+if __name__ == '__main__':
+    main()
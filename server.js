@@ -3,7 +3,8 @@ const multer = require('multer');
 const path = require('path');
 const fs = require('fs');
 const cors = require('cors');
-const { exec } = require('child_process');
+const { spawn } = require('child_process');
+const readline = require('readline');
 const sharp = require('sharp');
 const session = require('express-session');
 
@@ -76,12 +77,90 @@ app.use(cors({
 }));
 app.use(express.json());
 
+// ETags e versões pré-comprimidas geradas pelo generate_catalog.py (.catalog-assets.json)
+const ASSETS_PATH = path.join(__dirname, '.catalog-assets.json');
+const PRECOMPRESSED = [['br', '.br'], ['gzip', '.gz']];
+let catalogAssets = { mtimeMs: null, assets: {} };
+
+function readCatalogAssets() {
+    try {
+        const { mtimeMs } = fs.statSync(ASSETS_PATH);
+        if (mtimeMs !== catalogAssets.mtimeMs) {
+            catalogAssets = { mtimeMs, assets: JSON.parse(fs.readFileSync(ASSETS_PATH, 'utf8')) };
+        }
+    } catch (error) {
+        catalogAssets = { mtimeMs: null, assets: {} };
+    }
+    return catalogAssets.assets;
+}
+
+// Os fragmentos (catalog/<categoria>.<hash>.html) têm o hash do conteúdo no nome:
+// um nome nunca muda de conteúdo. Só o index.html precisa ser revalidado
+const SHARD_CACHE_CONTROL = 'public, max-age=31536000, immutable';
+
+// Servir o index.html e os fragmentos do catálogo já comprimidos, com 304 pela ETag
+app.get(['/', '/index.html', '/catalog/*.html'], (req, res, next) => {
+    let relPath = 'index.html';
+    if (req.path !== '/') {
+        try {
+            relPath = decodeURIComponent(req.path).slice(1);
+        } catch (error) {
+            // Escape inválido (ex.: %E0): deixa o express.static responder
+            return next();
+        }
+    }
+    const filePath = path.join(__dirname, relPath);
+    const asset = readCatalogAssets()[relPath];
+    if (!asset || !filePath.startsWith(__dirname + path.sep)) {
+        return next();
+    }
+
+    // Só vale se o HTML no disco ainda é o que o manifesto descreve
+    // (mtime em nanossegundos no manifesto; perde precisão no JSON.parse, daí a tolerância)
+    try {
+        const stat = fs.statSync(filePath);
+        if (stat.size !== asset.size || Math.abs(stat.mtimeMs - asset.mtime / 1e6) >= 1) {
+            return next();
+        }
+    } catch (error) {
+        return next();
+    }
+
+    const accepted = req.headers['accept-encoding'] || '';
+    for (const [encoding, suffix] of PRECOMPRESSED) {
+        if (!asset[encoding] || !accepted.includes(encoding)) {
+            continue;
+        }
+
+        const etag = `"${asset.etag}-${encoding}"`;
+        res.set({
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+            'Cache-Control': relPath === 'index.html' ? 'no-cache' : SHARD_CACHE_CONTROL
+        });
+        if (req.headers['if-none-match'] === etag) {
+            return res.status(304).end();
+        }
+        res.set({ 'Content-Encoding': encoding, 'Content-Type': 'text/html; charset=UTF-8' });
+        return res.sendFile(filePath + suffix, { etag: false, lastModified: false });
+    }
+    next();
+});
+
 // Servir arquivos estáticos com opções para lidar com encoding
 app.use(express.static(__dirname, {
     setHeaders: (res, path) => {
+        if (res.req.path.startsWith('/catalog/') && path.endsWith('.html')) {
+            res.set('Cache-Control', SHARD_CACHE_CONTROL);
+        }
         // Garantir encoding correto para caracteres especiais
-        if (path.endsWith('.jpg') || path.endsWith('.png') || path.endsWith('.gif') || path.endsWith('.webp')) {
-            res.set('Content-Type', 'image/jpeg');
+        if (/\.(jpe?g|png|gif|webp)$/i.test(path)) {
+            // Variantes WebP (srcset) são WebP; os thumbnails têm o nome do original com conteúdo JPEG
+            res.set('Content-Type', path.toLowerCase().endsWith('.webp') ? 'image/webp' : 'image/jpeg');
+            // URLs com ?v=<hash do conteúdo> (geradas pelo generate_catalog.py) nunca mudam de conteúdo
+            if (res.req.query.v) {
+                res.set('Cache-Control', 'public, max-age=31536000, immutable');
+            }
         }
     }
 }));
@@ -273,6 +352,105 @@ app.post('/api/create-category', requireAdmin, (req, res) => {
     }
 });
 
+// Processo Python persistente (generate_catalog.py --worker) que mantém o
+// manifesto e o template em memória: evita pagar a inicialização do
+// interpretador e a releitura de tudo a cada operação de admin.
+// Protocolo: um comando JSON por linha no stdin, uma resposta JSON por linha no stdout.
+let catalogWorker = null;
+const catalogWorkerQueue = [];
+
+function failPendingCatalogCommands(error) {
+    while (catalogWorkerQueue.length) {
+        catalogWorkerQueue.shift()(error, null);
+    }
+}
+
+function getCatalogWorker() {
+    if (catalogWorker) {
+        return catalogWorker;
+    }
+
+    // CATALOG_TIMINGS=1 registra no log o tempo de cada fase dos builds;
+    // CATALOG_PROFILE=<arquivo> grava o cProfile do último comando
+    const args = ['generate_catalog.py', '--worker'];
+    if (process.env.CATALOG_TIMINGS) {
+        args.push('--timings');
+    }
+    if (process.env.CATALOG_PROFILE) {
+        args.push('--profile', process.env.CATALOG_PROFILE);
+    }
+    const worker = spawn('python3', args, { cwd: __dirname });
+    catalogWorker = worker;
+
+    readline.createInterface({ input: worker.stdout }).on('line', (line) => {
+        const callback = catalogWorkerQueue.shift();
+        if (!callback) {
+            return;
+        }
+        let response;
+        try {
+            response = JSON.parse(line);
+        } catch (e) {
+            response = { ok: false, error: line };
+        }
+        if (response.timings) {
+            console.log(`⏱️  Build do catálogo: ${JSON.stringify(response.timings)}`);
+        }
+        callback(response.ok ? null : new Error(response.error), response);
+    });
+
+    worker.stderr.on('data', (data) => console.error(data.toString()));
+
+    const onExit = (reason) => {
+        if (catalogWorker === worker) {
+            catalogWorker = null;
+        }
+        console.error(`⚠️  Worker do catálogo encerrado: ${reason}`);
+        failPendingCatalogCommands(new Error('Worker do catálogo encerrado'));
+    };
+    worker.on('error', (error) => onExit(error.message));
+    worker.stdin.on('error', (error) => onExit(error.message));
+    worker.on('exit', (code) => onExit(`código ${code}`));
+
+    return worker;
+}
+
+// Envia um comando ao worker, ex.: { cmd: 'patch', add: ['Body/1.jpg'] } ou { cmd: 'rebuild' }
+function runCatalogCommand(command, callback) {
+    const worker = getCatalogWorker();
+    catalogWorkerQueue.push(callback);
+    worker.stdin.write(JSON.stringify(command) + '\n');
+}
+
+// Atualiza no index.html apenas a categoria afetada (patch de seções)
+function patchCatalog(changes, successMessage) {
+    runCatalogCommand({ cmd: 'patch', ...changes }, (error, response) => {
+        if (error) {
+            console.error('❌ Erro ao regerar HTML:', error);
+        } else {
+            console.log(`${successMessage} (${response.elapsed_ms} ms)`);
+        }
+    });
+}
+
+// Variantes WebP geradas por generate_catalog.py --thumbnails (<thumbnail>.<largura>w.webp)
+function thumbnailVariants(thumbnailPath) {
+    const directory = path.dirname(thumbnailPath);
+    const prefix = path.basename(thumbnailPath) + '.';
+    if (!fs.existsSync(directory)) {
+        return [];
+    }
+    return fs.readdirSync(directory)
+        .filter(name => name.startsWith(prefix) && /^\d+w\.webp$/.test(name.slice(prefix.length)))
+        .map(name => ({ path: path.join(directory, name), suffix: name.slice(prefix.length - 1) }));
+}
+
+// Remove as variantes (ex.: imagem substituída ou deletada); o catálogo volta a
+// usar o thumbnail até o próximo generate_catalog.py --thumbnails
+function removeThumbnailVariants(thumbnailPath) {
+    thumbnailVariants(thumbnailPath).forEach(variant => fs.unlinkSync(variant.path));
+}
+
 // Função para gerar thumbnail
 async function generateThumbnail(imagePath) {
     try {
@@ -326,13 +504,7 @@ app.post('/api/add-product', requireAdmin, upload.single('image'), async (req, r
         });
 
         // Regenerar HTML automaticamente
-        exec(`cd "${__dirname}" && python3 generate_catalog.py`, (error, stdout, stderr) => {
-            if (error) {
-                console.error('❌ Erro ao regerar HTML:', error);
-            } else {
-                console.log('✅ HTML regenerado automaticamente');
-            }
-        });
+        patchCatalog({ add: [imagePath.replace(/\\/g, '/')] }, '✅ HTML regenerado automaticamente');
 
         res.json({
             success: true,
@@ -411,6 +583,12 @@ app.put('/api/rename-product', requireAdmin, (req, res) => {
             console.log(`✅ Thumbnail movido: ${oldThumbnailPath} → ${newThumbnailPath}`);
         }
 
+        // Mover as variantes WebP junto com o thumbnail
+        thumbnailVariants(oldThumbnailPath).forEach(variant => {
+            fs.mkdirSync(path.dirname(newThumbnailPath), { recursive: true });
+            fs.renameSync(variant.path, newThumbnailPath + variant.suffix);
+        });
+
         // Tentar remover diretório antigo se estiver vazio
         try {
             const oldDirectory = path.dirname(oldPath);
@@ -431,13 +609,7 @@ app.put('/api/rename-product', requireAdmin, (req, res) => {
         }
 
         // Regenerar HTML automaticamente
-        exec(`cd "${__dirname}" && python3 generate_catalog.py`, (error, stdout, stderr) => {
-            if (error) {
-                console.error('❌ Erro ao regerar HTML:', error);
-            } else {
-                console.log('✅ HTML regenerado após edição');
-            }
-        });
+        patchCatalog({ rename: [[imagePath, newRelativePath.replace(/\\/g, '/')]] }, '✅ HTML regenerado após edição');
 
         const actionMessage = (newCategory && newCategory !== currentCategory) || (newSubcategory !== currentSubcategory)
             ? 'Produto movido e renomeado com sucesso!'
@@ -490,6 +662,7 @@ app.delete('/api/delete-product', requireAdmin, (req, res) => {
             fs.unlinkSync(thumbnailPath);
             console.log(`✅ Thumbnail deletado: ${thumbnailPath}`);
         }
+        removeThumbnailVariants(thumbnailPath);
 
         // Registrar log
         addAuditLog('DELETAR_PRODUTO', req.session.username || 'desconhecido', {
@@ -498,13 +671,7 @@ app.delete('/api/delete-product', requireAdmin, (req, res) => {
         });
 
         // Regenerar HTML automaticamente
-        exec(`cd "${__dirname}" && python3 generate_catalog.py`, (error, stdout, stderr) => {
-            if (error) {
-                console.error('❌ Erro ao regerar HTML:', error);
-            } else {
-                console.log('✅ HTML regenerado após exclusão');
-            }
-        });
+        patchCatalog({ remove: [imagePath] }, '✅ HTML regenerado após exclusão');
 
         res.json({
             success: true,
@@ -550,13 +717,18 @@ app.post('/api/update-image', requireAdmin, uploadTemp.single('image'), async (r
         const tempPath = req.file.path;
         const finalPath = path.join(directory, filename);
 
-        // Substituir arquivo original
-        fs.copyFileSync(tempPath, finalPath);
+        // Substituir arquivo original: copiar para um temporário na mesma pasta e
+        // renomear por cima. Gravar no lugar mudaria junto as cópias ligadas por hard
+        // link (dedupe_images.py --link) nas outras categorias, que o gerador não relê
+        const swapPath = path.join(directory, `.${filename}.${process.pid}.tmp`);
+        fs.copyFileSync(tempPath, swapPath);
+        fs.renameSync(swapPath, finalPath);
         fs.unlinkSync(tempPath);
 
         console.log(`✅ Imagem atualizada: ${finalPath}`);
 
-        // Regenerar thumbnail
+        // Regenerar thumbnail (as variantes WebP antigas mostrariam a imagem anterior)
+        removeThumbnailVariants(oldThumbnailPath);
         await generateThumbnail(finalPath);
 
         // Registrar log
@@ -565,14 +737,9 @@ app.post('/api/update-image', requireAdmin, uploadTemp.single('image'), async (r
             caminho: imagePath
         });
 
-        // Regenerar HTML automaticamente
-        exec(`cd "${__dirname}" && python3 generate_catalog.py`, (error, stdout, stderr) => {
-            if (error) {
-                console.error('❌ Erro ao regerar HTML:', error);
-            } else {
-                console.log('✅ HTML regenerado após edição de imagem');
-            }
-        });
+        // Atualizar a categoria da imagem: o patch relê a pasta e compara tamanho e
+        // mtime de cada arquivo, então a imagem ganha o hash novo e a URL muda de ?v=
+        patchCatalog({ add: [imagePath] }, '✅ HTML regenerado após edição de imagem');
 
         res.json({
             success: true,
@@ -602,8 +769,8 @@ app.get('*.(jpg|jpeg|png|gif|webp)', (req, res, next) => {
 // Rota para regerar o HTML
 app.post('/api/regenerate-html', requireAdmin, (req, res) => {
     try {
-        // Executar o script Python para regerar o HTML
-        exec(`cd "${__dirname}" && python3 generate_catalog.py`, (error, stdout, stderr) => {
+        // Rebuild completo: ignora o manifesto e relê todas as imagens (corrige um manifesto desatualizado)
+        runCatalogCommand({ cmd: 'rebuild', full: true }, (error, response) => {
             if (error) {
                 console.error('Erro ao regerar HTML:', error);
                 return res.status(500).json({ error: 'Erro ao regerar HTML: ' + error.message });
@@ -612,7 +779,7 @@ app.post('/api/regenerate-html', requireAdmin, (req, res) => {
             res.json({
                 success: true,
                 message: 'Catálogo atualizado com sucesso! Recarregue a página.',
-                output: stdout
+                output: response.output
             });
         });
     } catch (error) {
@@ -629,4 +796,15 @@ app.listen(PORT, '0.0.0.0', () => {
     console.log(`? Servidor rodando na porta ${PORT}`);
     console.log(`? Diret�rio: ${__dirname}`);
     console.log(`? Acesse: ${process.env.RENDER_EXTERNAL_URL || 'http://localhost:' + PORT}`);
+});
+
+// Build ao iniciar: num deploy novo só existem as imagens e o index.html do
+// repositório; o search-index.json, o manifesto e os comprimidos são gerados
+// aqui (incremental: com o manifesto em dia, quase nada é refeito)
+runCatalogCommand({ cmd: 'rebuild' }, (error, response) => {
+    if (error) {
+        console.error('❌ Erro ao gerar o catálogo na inicialização:', error);
+    } else {
+        console.log(`✅ Catálogo gerado na inicialização (${response.elapsed_ms} ms)`);
+    }
 });
\ No newline at end of file